@@ -5,17 +5,21 @@
 基于K取值决策，生成最终的聚类结果、画像描述和可视化
 """
 
+import math
 import pandas as pd
 import numpy as np
+from numba import njit, prange
 import matplotlib.pyplot as plt
+from matplotlib.patches import Patch
 import seaborn as sns
 from pathlib import Path
 from colorama import init, Fore
 from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
-from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
+from sklearn.metrics import silhouette_score, davies_bouldin_score
 import umap
+import joblib
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -24,10 +28,27 @@ init(autoreset=True)
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Arial Unicode MS']
 plt.rcParams['axes.unicode_minus'] = False
+# 大量点/路径分块光栅化
+plt.rcParams['agg.path.chunksize'] = 10000
 # 设置seaborn样式
 sns.set_style("whitegrid")
 
 
+@njit(parallel=True, fastmath=True, cache=True)
+def _clr_kernel(X, out):
+    """逐行CLR：log(x+ε) 减去行内对数均值（即除以几何平均），并行、无中间数组"""
+    n, d = X.shape
+    for i in prange(n):
+        s = 0.0
+        for j in range(d):
+            v = math.log(X[i, j] + 1e-6)
+            out[i, j] = v
+            s += v
+        m = s / d
+        for j in range(d):
+            out[i, j] -= m
+
+
 class FinalClusteringAnalyzer:
     """最终聚类分析器 - K=8"""
     
@@ -63,21 +84,31 @@ class FinalClusteringAnalyzer:
             'w_range': '续航',
             'w_value': '性价比'
         }
+        # 与 self.dimensions 对齐的中文名数组，支持按索引数组批量取名
+        self.dimension_names_arr = np.array([self.dimension_names_cn[d] for d in self.dimensions])
         
         # 数据存储
         self.df_data = None
         self.X_processed = None
         self.scaler = None
+        self.pca = None
         self.model = None
         self.labels = None
         self.centroids = None
+        self.centroid_rank = None
+        self.cluster_sizes = None
+        self.total = None
+        self.label_order = None
+        self.cluster_starts = None
+        self.centers_processed = None
+        self.X_tsne = None
+        self.X_umap = None
     
     def clr_transform(self, X):
-        """CLR变换"""
-        epsilon = 1e-6
-        X_safe = X + epsilon
-        geometric_mean = np.exp(np.mean(np.log(X_safe), axis=1, keepdims=True))
-        X_clr = np.log(X_safe / geometric_mean)
+        """CLR变换（Numba内核）"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        X_clr = np.empty(X.shape, dtype=np.float32)
+        _clr_kernel(X, X_clr)
         return X_clr
     
     def load_and_preprocess(self):
@@ -87,7 +118,7 @@ class FinalClusteringAnalyzer:
         print(Fore.CYAN + "=" * 70)
         
         print(Fore.YELLOW + f"\n步骤1：加载数据...")
-        self.df_data = pd.read_csv(self.input_file, encoding='utf-8-sig')
+        self.df_data = pd.read_csv(self.input_file, encoding='utf-8-sig', engine='pyarrow')
         print(Fore.GREEN + f"✓ 加载 {len(self.df_data)} 条用户数据")
         
         print(Fore.YELLOW + f"\n步骤2：数据预处理...")
@@ -97,21 +128,32 @@ class FinalClusteringAnalyzer:
         # CLR变换
         X_clr = self.clr_transform(X)
         
-        # 标准化
-        self.scaler = StandardScaler()
-        self.X_processed = self.scaler.fit_transform(X_clr)
+        # 标准化：float32 原地 z-score（与 StandardScaler 相同，标准差为0的列不缩放）
+        mu = X_clr.mean(axis=0, dtype=np.float32)
+        std = X_clr.std(axis=0, dtype=np.float32)
+        std[std == 0] = 1.0
+        X_clr -= mu
+        X_clr /= std
+        self.scaler = (mu, std)
+        
+        # CLR行和为0，标准化后数据位于6维子空间；PCA旋转到6维不改变样本间距离
+        self.pca = PCA(n_components=len(self.dimensions) - 1, random_state=42)
+        self.X_processed = np.ascontiguousarray(
+            self.pca.fit_transform(X_clr), dtype=np.float32
+        )
         print(Fore.GREEN + f"✓ 预处理完成，数据形状: {self.X_processed.shape}")
     
     def perform_clustering(self):
         """执行K=8的聚类"""
         print(Fore.YELLOW + f"\n步骤3：执行聚类 (K={self.optimal_k})...")
         
-        # 运行多次取最佳
+        # 运行多次取最佳（低维float32连续数组上使用Elkan三角不等式剪枝）
         best_inertia = np.inf
         best_model = None
         
         for i in range(30):
-            model = KMeans(n_clusters=self.optimal_k, random_state=42+i, n_init=10, max_iter=300)
+            model = KMeans(n_clusters=self.optimal_k, random_state=42+i, n_init=10, max_iter=300,
+                           init='k-means++', algorithm='elkan')
             model.fit(self.X_processed)
             if model.inertia_ < best_inertia:
                 best_inertia = model.inertia_
@@ -120,24 +162,47 @@ class FinalClusteringAnalyzer:
         self.model = best_model
         self.labels = self.model.labels_
         
+        # 簇大小及按簇排序的样本索引（报告与绘图复用）
+        self.cluster_sizes = np.bincount(self.labels, minlength=self.optimal_k)
+        self.total = self.labels.size
+        self.label_order = np.argsort(self.labels, kind='stable')
+        self.cluster_starts = np.concatenate(([0], np.cumsum(self.cluster_sizes)[:-1]))
+        
         # 计算原始空间的聚类中心
-        self.centroids = []
-        for i in range(self.optimal_k):
-            cluster_mask = self.labels == i
-            cluster_data = self.df_data[cluster_mask][self.dimensions].values
-            centroid = cluster_data.mean(axis=0)
-            self.centroids.append(centroid)
-        self.centroids = np.array(self.centroids)
+        self.centroids = self.cluster_means(self.df_data[self.dimensions].values)
+        
+        # 各簇维度按权重降序排名
+        self.centroid_rank = np.argsort(-self.centroids, axis=1)
+        
+        # 预处理空间的聚类中心（质量指标复用）
+        self.centers_processed = self.cluster_means(self.X_processed.astype(np.float64))
         
         print(Fore.GREEN + f"✓ 聚类完成")
         
         # 显示聚类大小
-        cluster_sizes = np.bincount(self.labels)
         print(Fore.WHITE + f"\n聚类大小分布:")
-        for i, size in enumerate(cluster_sizes):
-            percentage = size / len(self.labels) * 100
+        for i, size in enumerate(self.cluster_sizes):
+            percentage = size / self.total * 100
             print(Fore.WHITE + f"  Cluster {i}: {size:6d} ({percentage:5.2f}%)")
     
+    def cluster_means(self, X):
+        """按簇求均值：按标签排序后对连续切片做一次 reduceat"""
+        sums = np.add.reduceat(X[self.label_order], self.cluster_starts, axis=0)
+        return sums / self.cluster_sizes[:, None]
+    
+    def calinski_harabasz(self):
+        """基于已缓存的簇中心计算 Calinski-Harabasz 指数（与 sklearn 定义一致）"""
+        k, n = self.optimal_k, self.total
+        X = self.X_processed.astype(np.float64)
+        overall = X.mean(axis=0)
+        
+        # 簇间平方和 / 簇内平方和（WCSS = Σ||x||² − Σ n_i·||c_i||²）
+        bcss = np.sum(self.cluster_sizes * ((self.centers_processed - overall) ** 2).sum(axis=1))
+        wcss = np.einsum('ij,ij->', X, X) - np.sum(
+            self.cluster_sizes * (self.centers_processed ** 2).sum(axis=1)
+        )
+        return (bcss / (k - 1)) / (wcss / (n - k))
+    
     def generate_cluster_labels_csv(self):
         """生成 step3_cluster_labels.csv"""
         print(Fore.YELLOW + f"\n步骤4：生成聚类标签文件...")
@@ -159,24 +224,18 @@ class FinalClusteringAnalyzer:
         """生成 step3_cluster_centroids.csv"""
         print(Fore.YELLOW + f"\n步骤5：生成聚类中心文件...")
         
-        # 创建DataFrame
-        centroid_data = []
-        for i in range(self.optimal_k):
-            row = {'cluster': i}
-            for j, dim in enumerate(self.dimensions):
-                row[f'centroid_{dim}'] = self.centroids[i, j]
-            centroid_data.append(row)
-        
-        df_centroids = pd.DataFrame(centroid_data)
+        # 直接写出 K×7 矩阵（首列为簇编号）
+        header = 'cluster,' + ','.join(f'centroid_{dim}' for dim in self.dimensions)
+        rows = np.column_stack([np.arange(self.optimal_k), self.centroids])
+        fmt = ['%d'] + ['%.17g'] * len(self.dimensions)
         
         # 保存
         output_file = self.output_dir / "step3_cluster_centroids.csv"
-        df_centroids.to_csv(output_file, index=False, encoding='utf-8-sig')
+        np.savetxt(output_file, rows, delimiter=',', header=header, comments='',
+                   fmt=fmt, encoding='utf-8-sig')
         print(Fore.GREEN + f"✓ 已保存: {output_file.name}")
-        
-        return df_centroids
     
-    def generate_cluster_profile_md(self, df_centroids):
+    def generate_cluster_profile_md(self):
         """生成 step3_cluster_profile.md"""
         print(Fore.YELLOW + f"\n步骤6：生成聚类画像描述...")
         
@@ -191,8 +250,8 @@ class FinalClusteringAnalyzer:
             
             # 为每个簇生成画像
             for i in range(self.optimal_k):
-                cluster_size = np.sum(self.labels == i)
-                cluster_pct = cluster_size / len(self.labels) * 100
+                cluster_size = self.cluster_sizes[i]
+                cluster_pct = cluster_size / self.total * 100
                 
                 f.write(f"## Cluster {i}：")
                 
@@ -200,7 +259,8 @@ class FinalClusteringAnalyzer:
                 centroid = self.centroids[i]
                 
                 # 找出前3个最关注的维度
-                top_indices = np.argsort(centroid)[-3:][::-1]
+                sorted_indices = self.centroid_rank[i]
+                top_indices = sorted_indices[:3]
                 top_dims = [self.dimensions[idx] for idx in top_indices]
                 top_values = [centroid[idx] for idx in top_indices]
                 
@@ -217,7 +277,6 @@ class FinalClusteringAnalyzer:
                 f.write("|------|------|------|\n")
                 
                 # 按权重排序显示所有维度
-                sorted_indices = np.argsort(centroid)[::-1]
                 for rank, idx in enumerate(sorted_indices, 1):
                     dim_name = self.dimension_names_cn[self.dimensions[idx]]
                     weight = centroid[idx]
@@ -256,7 +315,7 @@ class FinalClusteringAnalyzer:
         # 计算评估指标
         silhouette = silhouette_score(self.X_processed, self.labels)
         davies_bouldin = davies_bouldin_score(self.X_processed, self.labels)
-        calinski = calinski_harabasz_score(self.X_processed, self.labels)
+        calinski = self.calinski_harabasz()
         
         output_file = self.output_dir / "step3_quality_report.md"
         
@@ -283,14 +342,13 @@ class FinalClusteringAnalyzer:
             f.write("| Cluster | 样本数 | 占比 | 分布图 |\n")
             f.write("|---------|--------|------|--------|\n")
             
-            cluster_sizes = np.bincount(self.labels)
             for i in range(self.optimal_k):
-                size = cluster_sizes[i]
-                pct = size / len(self.labels) * 100
+                size = self.cluster_sizes[i]
+                pct = size / self.total * 100
                 bar = '█' * int(pct / 2)  # 每2%一个方块
                 f.write(f"| Cluster {i} | {size:,} | {pct:.2f}% | {bar} |\n")
             
-            f.write(f"\n**总计**: {len(self.labels):,} 个用户\n\n")
+            f.write(f"\n**总计**: {self.total:,} 个用户\n\n")
             
             f.write("---\n\n")
             
@@ -302,30 +360,20 @@ class FinalClusteringAnalyzer:
             f.write("|---------|----------|----------|----------|\n")
             
             for i in range(self.optimal_k):
-                centroid = self.centroids[i]
-                top_indices = np.argsort(centroid)[-3:][::-1]
-                top_dims = [self.dimension_names_cn[self.dimensions[idx]] for idx in top_indices]
+                top_dims = self.dimension_names_arr[self.centroid_rank[i, :3]]
                 f.write(f"| Cluster {i} | {top_dims[0]} | {top_dims[1]} | {top_dims[2]} |\n")
             
             f.write("\n### 关键发现\n\n")
             
-            # 分析维度的整体分布
-            dimension_variance = np.var(self.centroids, axis=0)
-            most_varied_idx = np.argmax(dimension_variance)
-            most_varied_dim = self.dimension_names_cn[self.dimensions[most_varied_idx]]
+            # 分析维度的整体分布（方差与极差各一次向量化计算，一次批量取名）
+            dimension_variance = self.centroids.var(axis=0)
+            max_spread = np.ptp(self.centroids, axis=0)
+            most_varied_dim, least_varied_dim, most_spread_dim = self.dimension_names_arr[
+                [dimension_variance.argmax(), dimension_variance.argmin(), max_spread.argmax()]
+            ]
             
             f.write(f"- **分化最明显的维度**: {most_varied_dim}（不同用户群体对此关注度差异最大）\n")
-            
-            least_varied_idx = np.argmin(dimension_variance)
-            least_varied_dim = self.dimension_names_cn[self.dimensions[least_varied_idx]]
-            
             f.write(f"- **最一致的维度**: {least_varied_dim}（各用户群体关注度较为一致）\n")
-            
-            # 找出最极端的簇
-            max_spread = np.max(self.centroids, axis=0) - np.min(self.centroids, axis=0)
-            most_spread_idx = np.argmax(max_spread)
-            most_spread_dim = self.dimension_names_cn[self.dimensions[most_spread_idx]]
-            
             f.write(f"- **跨度最大的维度**: {most_spread_dim}（簇间权重差异最显著）\n\n")
             
             f.write("---\n\n")
@@ -370,26 +418,24 @@ class FinalClusteringAnalyzer:
         
         fig, axes = plt.subplots(1, 2, figsize=(16, 7))
         
-        # 颜色配置
+        # 颜色配置：逐点颜色一次查表，单次scatter绘制全部点
         colors = plt.cm.Set3(np.linspace(0, 1, self.optimal_k))
+        point_colors = colors[self.labels]
+        legend_handles = [Patch(facecolor=colors[i], label=f'Cluster {i}')
+                          for i in range(self.optimal_k)]
         
         # t-SNE降维
         print(Fore.WHITE + "    运行t-SNE...")
         tsne = TSNE(n_components=2, random_state=42, perplexity=30, max_iter=1000)
         X_tsne = tsne.fit_transform(self.X_processed)
+        self.X_tsne = X_tsne
         
         ax1 = axes[0]
-        for i in range(self.optimal_k):
-            mask = self.labels == i
-            ax1.scatter(X_tsne[mask, 0], X_tsne[mask, 1], 
-                       c=[colors[i]], label=f'Cluster {i}', 
-                       alpha=0.6, s=20, edgecolors='white', linewidth=0.5)
+        ax1.scatter(X_tsne[:, 0], X_tsne[:, 1], c=point_colors, 
+                   alpha=0.6, s=20, linewidths=0, rasterized=True)
         
         # 标注聚类中心
-        for i in range(self.optimal_k):
-            mask = self.labels == i
-            center_x = X_tsne[mask, 0].mean()
-            center_y = X_tsne[mask, 1].mean()
+        for i, (center_x, center_y) in enumerate(self.cluster_means(X_tsne)):
             ax1.scatter(center_x, center_y, c='red', s=200, marker='*', 
                        edgecolors='darkred', linewidth=2, zorder=5)
             ax1.annotate(f'C{i}', (center_x, center_y), 
@@ -399,26 +445,21 @@ class FinalClusteringAnalyzer:
         ax1.set_title('t-SNE 降维可视化', fontsize=14, fontweight='bold')
         ax1.set_xlabel('t-SNE维度1')
         ax1.set_ylabel('t-SNE维度2')
-        ax1.legend(loc='best', fontsize=9)
+        ax1.legend(handles=legend_handles, loc='best', fontsize=9)
         ax1.grid(True, alpha=0.3)
         
         # UMAP降维
         print(Fore.WHITE + "    运行UMAP...")
         reducer = umap.UMAP(n_components=2, random_state=42, n_neighbors=15, min_dist=0.1)
         X_umap = reducer.fit_transform(self.X_processed)
+        self.X_umap = X_umap
         
         ax2 = axes[1]
-        for i in range(self.optimal_k):
-            mask = self.labels == i
-            ax2.scatter(X_umap[mask, 0], X_umap[mask, 1], 
-                       c=[colors[i]], label=f'Cluster {i}', 
-                       alpha=0.6, s=20, edgecolors='white', linewidth=0.5)
+        ax2.scatter(X_umap[:, 0], X_umap[:, 1], c=point_colors, 
+                   alpha=0.6, s=20, linewidths=0, rasterized=True)
         
         # 标注聚类中心
-        for i in range(self.optimal_k):
-            mask = self.labels == i
-            center_x = X_umap[mask, 0].mean()
-            center_y = X_umap[mask, 1].mean()
+        for i, (center_x, center_y) in enumerate(self.cluster_means(X_umap)):
             ax2.scatter(center_x, center_y, c='red', s=200, marker='*', 
                        edgecolors='darkred', linewidth=2, zorder=5)
             ax2.annotate(f'C{i}', (center_x, center_y), 
@@ -428,14 +469,14 @@ class FinalClusteringAnalyzer:
         ax2.set_title('UMAP 降维可视化', fontsize=14, fontweight='bold')
         ax2.set_xlabel('UMAP维度1')
         ax2.set_ylabel('UMAP维度2')
-        ax2.legend(loc='best', fontsize=9)
+        ax2.legend(handles=legend_handles, loc='best', fontsize=9)
         ax2.grid(True, alpha=0.3)
         
         plt.suptitle('用户聚类空间分布 (K=8)', fontsize=16, fontweight='bold', y=0.995)
         plt.tight_layout()
         
         output_file = self.output_dir / "step3_tsne_umap.png"
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        plt.savefig(output_file, dpi=150, bbox_inches='tight')
         plt.close()
         
         print(Fore.GREEN + f"    ✓ {output_file.name}")
@@ -446,7 +487,7 @@ class FinalClusteringAnalyzer:
         
         fig, axes = plt.subplots(1, 2, figsize=(16, 6))
         
-        cluster_sizes = np.bincount(self.labels)
+        cluster_sizes = self.cluster_sizes
         cluster_labels = [f'Cluster {i}' for i in range(self.optimal_k)]
         colors = plt.cm.Set3(np.linspace(0, 1, self.optimal_k))
         
@@ -458,7 +499,7 @@ class FinalClusteringAnalyzer:
         # 添加数值标签
         for i, (bar, size) in enumerate(zip(bars, cluster_sizes)):
             height = bar.get_height()
-            pct = size / len(self.labels) * 100
+            pct = size / self.total * 100
             ax1.text(bar.get_x() + bar.get_width()/2., height,
                     f'{size:,}\n({pct:.1f}%)',
                     ha='center', va='bottom', fontsize=10, fontweight='bold')
@@ -488,7 +529,7 @@ class FinalClusteringAnalyzer:
         
         ax2.set_title('聚类大小分布 - 饼图', fontsize=14, fontweight='bold')
         
-        plt.suptitle(f'8个用户群体样本分布 (总计: {len(self.labels):,})', 
+        plt.suptitle(f'8个用户群体样本分布 (总计: {self.total:,})', 
                     fontsize=16, fontweight='bold', y=0.995)
         plt.tight_layout()
         
@@ -498,6 +539,25 @@ class FinalClusteringAnalyzer:
         
         print(Fore.GREEN + f"    ✓ {output_file.name}")
     
+    def save_bundle(self):
+        """保存 step3_bundle.joblib（模型、预处理器、标签、中心与降维坐标）"""
+        print(Fore.YELLOW + f"\n步骤9：保存模型与嵌入...")
+        
+        bundle = {
+            'model': self.model,
+            'scaler': self.scaler,
+            'pca': self.pca,
+            'review_id': self.df_data['review_id'].values,
+            'labels': self.labels,
+            'centroids': self.centroids,
+            'X_tsne': self.X_tsne,
+            'X_umap': self.X_umap,
+        }
+        
+        output_file = self.output_dir / "step3_bundle.joblib"
+        joblib.dump(bundle, output_file, compress=3)
+        print(Fore.GREEN + f"✓ 已保存: {output_file.name}")
+    
     def run(self):
         """运行完整的最终聚类分析流程"""
         try:
@@ -511,10 +571,10 @@ class FinalClusteringAnalyzer:
             self.generate_cluster_labels_csv()
             
             # 步骤5: 生成聚类中心CSV
-            df_centroids = self.generate_centroids_csv()
+            self.generate_centroids_csv()
             
             # 步骤6: 生成聚类画像描述
-            self.generate_cluster_profile_md(df_centroids)
+            self.generate_cluster_profile_md()
             
             # 步骤7: 生成质量报告
             self.generate_quality_report_md()
@@ -522,6 +582,9 @@ class FinalClusteringAnalyzer:
             # 步骤8: 生成可视化
             self.generate_visualizations()
             
+            # 步骤9: 保存模型与嵌入
+            self.save_bundle()
+            
             print(Fore.CYAN + f"\n{'=' * 70}")
             print(Fore.GREEN + "最终聚类分析完成！")
             print(Fore.CYAN + f"{'=' * 70}")
@@ -533,6 +596,7 @@ class FinalClusteringAnalyzer:
             print(Fore.WHITE + "  4. step3_quality_report.md - 质量诊断报告")
             print(Fore.WHITE + "  5. step3_tsne_umap.png - 降维可视化")
             print(Fore.WHITE + "  6. step3_cluster_size_dist.png - 大小分布图")
+            print(Fore.WHITE + "  7. step3_bundle.joblib - 模型与降维坐标")
             print(Fore.CYAN + f"{'=' * 70}")
             
         except Exception as e:
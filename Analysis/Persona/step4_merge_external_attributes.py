@@ -7,20 +7,66 @@
 
 import pandas as pd
 import numpy as np
+import sys
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from pathlib import Path
 from datetime import datetime
-from colorama import init, Fore
+from colorama import init, Fore, Style
 import warnings
 
 warnings.filterwarnings('ignore')
 init(autoreset=True)
 
+# 分类区间（左闭右开）与标签
+UNKNOWN_LABEL = '未知'
+_USAGE_FREQUENCY_BINS = [-np.inf, 10, 30, 60, np.inf]
+_USAGE_FREQUENCY_LABELS = ['低频用车', '中频用车', '高频用车', '超高频用车']
+_MILEAGE_BINS = [-np.inf, 5000, 20000, 50000, 100000, np.inf]
+_MILEAGE_LABELS = ['新车期', '磨合期', '稳定期', '成熟期', '高里程']
+_PRICE_BINS = [-np.inf, 15, 25, 35, 50, np.inf]
+_PRICE_LABELS = ['15万以下', '15-25万', '25-35万', '35-50万', '50万以上']
+_RANGE_BINS = [-np.inf, 300, 500, 700, np.inf]
+_RANGE_LABELS = ['300km以下', '300-500km', '500-700km', '700km以上']
+_ENERGY_CONSUMPTION_BINS = [-np.inf, 15, 20, np.inf]
+_ENERGY_CONSUMPTION_LABELS = ['低能耗', '中能耗', '高能耗']
+
+# 从UGC数据中取用的字段（输出字段及派生字段的来源）
+UGC_COLUMNS = [
+    'brand', 'series', 'model',
+    'mileage', 'purchase_price', 'purchase_date', 'review_date',
+    'purchase_location',
+    'real_range', 'energy_consumption', 'season_type',
+    'space_score', 'driving_score', 'range_score', 'appearance_score',
+    'interior_score', 'value_score', 'intelligence_score'
+]
+
+# 载入时的紧凑数据类型（注意力向量保持 float64 原样输出）
+CLUSTER_DTYPES = {'cluster': 'int8'}
+UGC_DTYPES = {
+    'brand': 'category', 'series': 'category', 'model': 'category',
+    'season_type': 'category',
+    'mileage': 'float32', 'purchase_price': 'float32',
+    'real_range': 'float32', 'energy_consumption': 'float32',
+    'space_score': 'float32', 'driving_score': 'float32', 'range_score': 'float32',
+    'appearance_score': 'float32', 'interior_score': 'float32',
+    'value_score': 'float32', 'intelligence_score': 'float32'
+}
+
 
 class PersonaAttributeMerger:
     """用户画像外部属性合并器"""
     
-    def __init__(self):
+    def __init__(self, write_csv=True):
+        """
+        初始化合并器
+        
+        Args:
+            write_csv: 是否在 Parquet 之外同时写出 CSV（Graph/Vector 模块读取 CSV）
+        """
         self.base_path = Path(__file__).parent.parent.parent
         
         # 输入文件
@@ -30,6 +76,8 @@ class PersonaAttributeMerger:
         
         # 输出文件
         self.output_file = self.base_path / "Data" / "Analyzed" / "Persona" / "step4_user_persona_full.csv"
+        self.parquet_file = self.output_file.with_suffix('.parquet')
+        self.write_csv = write_csv
         
         # 用户画像名称映射
         self.cluster_names = {
@@ -50,8 +98,9 @@ class PersonaAttributeMerger:
         """加载地理位置映射字典"""
         print(Fore.CYAN + "正在加载地理位置映射...")
         try:
-            with open(self.geo_mapping_file, 'r', encoding='utf-8') as f:
-                geo_data = json.load(f)
+            with open(self.geo_mapping_file, 'rb') as f:
+                raw = f.read()
+                geo_data = orjson.loads(raw) if orjson else json.loads(raw.decode('utf-8'))
                 self.city_to_province = geo_data['city_to_province']
                 self.province_to_region = geo_data['province_to_region']
             print(Fore.GREEN + f"✓ 成功加载地理映射")
@@ -61,151 +110,45 @@ class PersonaAttributeMerger:
             print(Fore.RED + f"✗ 加载地理映射失败: {e}")
             raise
     
-    def map_city_to_province(self, city):
-        """将城市映射到省份"""
-        if pd.isna(city) or city is None:
-            return None
-        
-        city = str(city).strip()
+    def map_city_to_province(self, cities):
+        """将城市列映射到省份（整列字典查找）"""
+        cities = cities.astype('string').str.strip()
         
         # 直接匹配
-        if city in self.city_to_province:
-            return self.city_to_province[city]
+        provinces = cities.map(self.city_to_province)
         
         # 尝试去除"市"后缀
-        city_without_suffix = city.replace('市', '')
-        if city_without_suffix in self.city_to_province:
-            return self.city_to_province[city_without_suffix]
+        missing = provinces.isna()
+        provinces[missing] = cities[missing].str.replace('市', '', regex=False).map(self.city_to_province)
         
         # 四个直辖市特殊处理
-        if city in ['北京', '上海', '天津', '重庆']:
-            return city + '市'
+        municipality = provinces.isna() & cities.isin(['北京', '上海', '天津', '重庆'])
+        provinces[municipality] = cities[municipality] + '市'
         
-        return None
-    
-    def map_province_to_region(self, province):
-        """将省份映射到大区"""
-        if pd.isna(province) or province is None:
-            return None
-        
-        return self.province_to_region.get(province, None)
-    
-    def calculate_usage_frequency(self, row):
-        """计算用车频率 = 里程 / 用车天数"""
-        try:
-            mileage = row.get('mileage', None)
-            purchase_date = row.get('purchase_date', None)
-            review_date = row.get('review_date', None)
-            
-            # 检查必要字段
-            if pd.isna(mileage) or pd.isna(purchase_date) or pd.isna(review_date):
-                return None
-            
-            mileage = float(mileage)
-            
-            # 解析日期
-            try:
-                purchase_dt = pd.to_datetime(purchase_date)
-                review_dt = pd.to_datetime(review_date)
-            except:
-                return None
-            
-            # 计算天数差
-            days_diff = (review_dt - purchase_dt).days
-            
-            # 至少使用1天
-            if days_diff < 1:
-                days_diff = 1
-            
-            # 计算频率（公里/天）
-            frequency = mileage / days_diff
-            
-            return round(frequency, 2)
-            
-        except Exception as e:
-            return None
-    
-    def categorize_usage_frequency(self, frequency):
-        """将用车频率分类"""
-        if pd.isna(frequency) or frequency is None:
-            return '未知'
-        
-        frequency = float(frequency)
-        
-        if frequency < 10:
-            return '低频用车'
-        elif frequency < 30:
-            return '中频用车'
-        elif frequency < 60:
-            return '高频用车'
-        else:
-            return '超高频用车'
+        return provinces
     
-    def categorize_mileage(self, mileage):
-        """里程分类"""
-        if pd.isna(mileage) or mileage is None:
-            return '未知'
-        
-        mileage = float(mileage)
-        
-        if mileage < 5000:
-            return '新车期'
-        elif mileage < 20000:
-            return '磨合期'
-        elif mileage < 50000:
-            return '稳定期'
-        elif mileage < 100000:
-            return '成熟期'
-        else:
-            return '高里程'
+    def calculate_usage_frequency(self, df):
+        """计算用车频率 = 里程 / 用车天数（整列向量化，至少按1天计）"""
+        # format='mixed' 逐个值推断格式，避免整列按首个值推断格式后其余格式的日期被置为 NaT
+        purchase_dt = pd.to_datetime(df['purchase_date'], errors='coerce', format='mixed')
+        review_dt = pd.to_datetime(df['review_date'], errors='coerce', format='mixed')
+        mileage = pd.to_numeric(df['mileage'], errors='coerce')
+        
+        # 计算天数差
+        days_diff = (review_dt - purchase_dt).dt.days.clip(lower=1)
+        
+        # 计算频率（公里/天），任一字段缺失或无法解析时为 NaN
+        return (mileage / days_diff).round(2)
     
-    def categorize_price(self, price):
-        """购车价格分类"""
-        if pd.isna(price) or price is None:
-            return '未知'
-        
-        price = float(price)
-        
-        if price < 15:
-            return '15万以下'
-        elif price < 25:
-            return '15-25万'
-        elif price < 35:
-            return '25-35万'
-        elif price < 50:
-            return '35-50万'
-        else:
-            return '50万以上'
+    def categorize(self, values, bins, labels):
+        """按区间 [下界, 上界) 向量化分类，缺失值归为'未知'"""
+        values = pd.to_numeric(values, errors='coerce')
+        categories = pd.cut(values, bins=bins, labels=labels, right=False)
+        return categories.cat.add_categories([UNKNOWN_LABEL]).fillna(UNKNOWN_LABEL)
     
-    def categorize_range(self, real_range):
-        """实际续航分类"""
-        if pd.isna(real_range) or real_range is None:
-            return '未知'
-        
-        real_range = float(real_range)
-        
-        if real_range < 300:
-            return '300km以下'
-        elif real_range < 500:
-            return '300-500km'
-        elif real_range < 700:
-            return '500-700km'
-        else:
-            return '700km以上'
-    
-    def categorize_energy_consumption(self, consumption):
-        """能耗分类"""
-        if pd.isna(consumption) or consumption is None:
-            return '未知'
-        
-        consumption = float(consumption)
-        
-        if consumption < 15:
-            return '低能耗'
-        elif consumption < 20:
-            return '中能耗'
-        else:
-            return '高能耗'
+    def write_section(self, title, lines):
+        """整段输出统计信息：标题（青色）与各行拼接后一次写入 stdout"""
+        sys.stdout.write('\n'.join([Fore.CYAN + title + Style.RESET_ALL, *lines]) + '\n')
     
     def run(self):
         """执行完整的属性合并流程"""
@@ -215,40 +158,48 @@ class PersonaAttributeMerger:
         
         # 1. 载入聚类标签（已包含注意力向量）
         print(Fore.CYAN + f"\n正在载入聚类标签和注意力向量: {self.cluster_labels_file}")
-        df_clusters = pd.read_csv(self.cluster_labels_file)
+        df_clusters = pd.read_csv(self.cluster_labels_file, dtype=CLUSTER_DTYPES, engine='pyarrow')
         print(Fore.GREEN + f"✓ 成功载入 {len(df_clusters)} 条聚类标签（含注意力向量）")
         
         # 2. 载入UGC数据
         print(Fore.CYAN + f"\n正在载入UGC数据: {self.ugc_file}")
-        df_ugc = pd.read_csv(self.ugc_file)
+        # pyarrow 引擎需显式列名列表：先读表头，仅保留实际存在的所需列
+        ugc_header = pd.read_csv(self.ugc_file, nrows=0).columns
+        ugc_usecols = [col for col in ['review_id', *UGC_COLUMNS] if col in ugc_header]
+        ugc_dtypes = {col: dtype for col, dtype in UGC_DTYPES.items() if col in ugc_usecols}
+        df_ugc = pd.read_csv(self.ugc_file, usecols=ugc_usecols, dtype=ugc_dtypes, engine='pyarrow')
         print(Fore.GREEN + f"✓ 成功载入 {len(df_ugc)} 条评论数据")
         
         # 3. 合并数据
         print(Fore.CYAN + f"\n正在合并数据...")
-        df_merged = pd.merge(df_clusters, df_ugc, on='review_id', how='left')
+        # review_id 两侧统一因子化为 int32 编码，按整数键连接
+        n_clusters_rows = len(df_clusters)
+        join_keys, _ = pd.factorize(
+            pd.concat([df_clusters['review_id'], df_ugc['review_id']], ignore_index=True)
+        )
+        join_keys = join_keys.astype(np.int32)
+        df_clusters['_key'] = join_keys[:n_clusters_rows]
+        df_ugc.index = pd.Index(join_keys[n_clusters_rows:], name='_key')
+        
+        ugc_columns = [col for col in UGC_COLUMNS if col in df_ugc.columns]
+        df_merged = pd.merge(
+            df_clusters, df_ugc[ugc_columns], left_on='_key', right_index=True,
+            how='left', copy=False, sort=False, validate='m:1'
+        )
+        df_merged = df_merged.drop(columns='_key')
         print(Fore.GREEN + f"✓ 合并完成，共 {len(df_merged)} 条记录")
         
         # 4. 添加用户画像名称
         print(Fore.CYAN + f"\n正在添加用户画像名称...")
-        df_merged['persona_name'] = df_merged['cluster'].map(self.cluster_names)
+        df_merged['persona_name'] = df_merged['cluster'].map(self.cluster_names).astype('category')
         print(Fore.GREEN + f"✓ 用户画像名称添加完成")
         
         # 5. 添加地理位置字段
         print(Fore.CYAN + f"\n正在处理地理位置映射...")
-        df_merged['province'] = df_merged['purchase_location'].apply(self.map_city_to_province)
-        df_merged['region'] = df_merged['province'].apply(self.map_province_to_region)
-        
-        # 统计映射成功率
-        province_mapped = df_merged['province'].notna().sum()
-        region_mapped = df_merged['region'].notna().sum()
-        total = len(df_merged)
-        print(Fore.GREEN + f"✓ 省份映射成功率: {province_mapped}/{total} ({province_mapped/total*100:.1f}%)")
-        print(Fore.GREEN + f"✓ 大区映射成功率: {region_mapped}/{total} ({region_mapped/total*100:.1f}%)")
-        
-        # 6. 添加地理位置字段
-        print(Fore.CYAN + f"\n正在处理地理位置映射...")
-        df_merged['province'] = df_merged['purchase_location'].apply(self.map_city_to_province)
-        df_merged['region'] = df_merged['province'].apply(self.map_province_to_region)
+        df_merged['province'] = self.map_city_to_province(df_merged['purchase_location'])
+        df_merged['region'] = df_merged['province'].map(self.province_to_region)
+        df_merged['province'] = df_merged['province'].astype('category')
+        df_merged['region'] = df_merged['region'].astype('category')
         
         # 统计映射成功率
         province_mapped = df_merged['province'].notna().sum()
@@ -259,11 +210,9 @@ class PersonaAttributeMerger:
         
         # 6. 计算用车频率
         print(Fore.CYAN + f"\n正在计算用车频率...")
-        df_merged['usage_frequency_km_per_day'] = df_merged.apply(
-            self.calculate_usage_frequency, axis=1
-        )
-        df_merged['usage_frequency_category'] = df_merged['usage_frequency_km_per_day'].apply(
-            self.categorize_usage_frequency
+        df_merged['usage_frequency_km_per_day'] = self.calculate_usage_frequency(df_merged)
+        df_merged['usage_frequency_category'] = self.categorize(
+            df_merged['usage_frequency_km_per_day'], _USAGE_FREQUENCY_BINS, _USAGE_FREQUENCY_LABELS
         )
         
         freq_calculated = df_merged['usage_frequency_km_per_day'].notna().sum()
@@ -271,11 +220,17 @@ class PersonaAttributeMerger:
         
         # 7. 添加其他分类字段
         print(Fore.CYAN + f"\n正在添加分类字段...")
-        df_merged['mileage_category'] = df_merged['mileage'].apply(self.categorize_mileage)
-        df_merged['price_category'] = df_merged['purchase_price'].apply(self.categorize_price)
-        df_merged['range_category'] = df_merged['real_range'].apply(self.categorize_range)
-        df_merged['energy_consumption_category'] = df_merged['energy_consumption'].apply(
-            self.categorize_energy_consumption
+        df_merged['mileage_category'] = self.categorize(
+            df_merged['mileage'], _MILEAGE_BINS, _MILEAGE_LABELS
+        )
+        df_merged['price_category'] = self.categorize(
+            df_merged['purchase_price'], _PRICE_BINS, _PRICE_LABELS
+        )
+        df_merged['range_category'] = self.categorize(
+            df_merged['real_range'], _RANGE_BINS, _RANGE_LABELS
+        )
+        df_merged['energy_consumption_category'] = self.categorize(
+            df_merged['energy_consumption'], _ENERGY_CONSUMPTION_BINS, _ENERGY_CONSUMPTION_LABELS
         )
         
         # 8. 选择输出字段
@@ -340,88 +295,108 @@ class PersonaAttributeMerger:
         # 9. 保存结果
         print(Fore.CYAN + f"\n正在保存完整用户画像...")
         self.output_file.parent.mkdir(parents=True, exist_ok=True)
-        df_output.to_csv(self.output_file, index=False, encoding='utf-8-sig')
-        print(Fore.GREEN + f"✓ 完整用户画像已保存: {self.output_file}")
+        df_output.to_parquet(self.parquet_file, compression='zstd', index=False)
+        print(Fore.GREEN + f"✓ 完整用户画像已保存: {self.parquet_file}")
+        if self.write_csv:
+            df_output.to_csv(self.output_file, index=False, encoding='utf-8-sig')
+            print(Fore.GREEN + f"✓ 完整用户画像已保存: {self.output_file}")
         
         # 10. 输出统计信息
         print(Fore.CYAN + "\n" + "="*80)
         print(Fore.CYAN + "统计摘要")
         print(Fore.CYAN + "="*80)
         
-        print(Fore.CYAN + "\n【聚类分布】")
-        cluster_dist = df_output['cluster'].value_counts().sort_index()
-        for cluster, count in cluster_dist.items():
-            persona_name = self.cluster_names.get(cluster, '未知')
-            print(f"  Cluster {cluster} ({persona_name:8s}): {count:6d} ({count/len(df_output)*100:5.2f}%)")
-        
-        print(Fore.CYAN + "\n【品牌分布】 (Top 10)")
-        brand_dist = df_output['brand'].value_counts().head(10)
-        for brand, count in brand_dist.items():
-            print(f"  {brand:10s}: {count:5d}")
-        
-        print(Fore.CYAN + "\n【地区分布】")
-        region_dist = df_output['region'].value_counts()
-        for region, count in region_dist.items():
-            if pd.notna(region):
-                print(f"  {region:6s}: {count:5d} ({count/len(df_output)*100:5.2f}%)")
-        
-        print(Fore.CYAN + "\n【价格段分布】")
-        price_dist = df_output['price_category'].value_counts()
-        for category, count in price_dist.items():
-            if category != '未知':
-                print(f"  {category:10s}: {count:5d}")
-        
-        print(Fore.CYAN + "\n【用车频率分布】")
-        freq_dist = df_output['usage_frequency_category'].value_counts()
-        for category, count in freq_dist.items():
-            print(f"  {category:12s}: {count:5d}")
-        
-        print(Fore.CYAN + "\n【里程分布】")
-        mileage_dist = df_output['mileage_category'].value_counts()
-        for category, count in mileage_dist.items():
-            if category != '未知':
-                print(f"  {category:8s}: {count:5d}")
-        
-        print(Fore.CYAN + "\n【续航分布】")
-        range_dist = df_output['range_category'].value_counts()
-        for category, count in range_dist.items():
-            if category != '未知':
-                print(f"  {category:12s}: {count:5d}")
-        
-        print(Fore.CYAN + "\n【季节分布】")
-        season_dist = df_output['season_type'].value_counts()
-        for season, count in season_dist.items():
-            if pd.notna(season):
-                print(f"  {season:15s}: {count:5d}")
+        # 各分布一次性计数：分类列按类别计数（无需哈希），展示时再按频数排序并去掉零计数
+        summary_columns = ['cluster', 'brand', 'region', 'price_category', 'usage_frequency_category',
+                           'mileage_category', 'range_category', 'season_type']
+        stats = {col: df_output[col].value_counts(sort=False) for col in summary_columns}
+        
+        def distribution(col):
+            # 先按首次出现顺序排列再稳定排序，频数相同的类别保持原 value_counts 的先后顺序
+            counts = stats[col].reindex(df_output[col].dropna().unique())
+            return counts.sort_values(ascending=False, kind='stable')
+        
+        n_output = len(df_output)
+        
+        cluster_dist = stats['cluster'].sort_index()
+        self.write_section("\n【聚类分布】", [
+            f"  Cluster {cluster} ({self.cluster_names.get(cluster, '未知'):8s}): {count:6d} ({count/n_output*100:5.2f}%)"
+            for cluster, count in cluster_dist.items()
+        ])
+        
+        brand_dist = distribution('brand').head(10)
+        self.write_section("\n【品牌分布】 (Top 10)", [
+            f"  {brand:10s}: {count:5d}" for brand, count in brand_dist.items()
+        ])
+        
+        region_dist = distribution('region')
+        self.write_section("\n【地区分布】", [
+            f"  {region:6s}: {count:5d} ({count/n_output*100:5.2f}%)"
+            for region, count in region_dist.items() if pd.notna(region)
+        ])
+        
+        price_dist = distribution('price_category')
+        self.write_section("\n【价格段分布】", [
+            f"  {category:10s}: {count:5d}" for category, count in price_dist.items() if category != '未知'
+        ])
+        
+        freq_dist = distribution('usage_frequency_category')
+        self.write_section("\n【用车频率分布】", [
+            f"  {category:12s}: {count:5d}" for category, count in freq_dist.items()
+        ])
+        
+        mileage_dist = distribution('mileage_category')
+        self.write_section("\n【里程分布】", [
+            f"  {category:8s}: {count:5d}" for category, count in mileage_dist.items() if category != '未知'
+        ])
+        
+        range_dist = distribution('range_category')
+        self.write_section("\n【续航分布】", [
+            f"  {category:12s}: {count:5d}" for category, count in range_dist.items() if category != '未知'
+        ])
+        
+        season_dist = distribution('season_type')
+        self.write_section("\n【季节分布】", [
+            f"  {season:15s}: {count:5d}" for season, count in season_dist.items() if pd.notna(season)
+        ])
         
         # 11. 输出数据质量报告
-        print(Fore.CYAN + "\n【数据完整度】")
         key_fields = ['persona_name', 'w_appearance', 'w_interior', 'w_space', 'w_intelligence', 
                       'w_driving', 'w_range', 'w_value',
                       'mileage', 'purchase_price', 'province', 'real_range', 
                       'energy_consumption', 'usage_frequency_km_per_day']
-        for field in key_fields:
-            if field in df_output.columns:
-                non_null_count = df_output[field].notna().sum()
-                completeness = non_null_count / len(df_output) * 100
-                print(f"  {field:30s}: {completeness:5.1f}%")
+        self.write_section("\n【数据完整度】", [
+            f"  {field:30s}: {df_output[field].notna().sum() / n_output * 100:5.1f}%"
+            for field in key_fields if field in df_output.columns
+        ])
         
         # 12. 输出注意力向量统计
-        print(Fore.CYAN + "\n【注意力向量统计】")
         attention_cols = ['w_appearance', 'w_interior', 'w_space', 'w_intelligence', 
                          'w_driving', 'w_range', 'w_value']
+        attention_lines = []
         if all(col in df_output.columns for col in attention_cols):
-            print(Fore.CYAN + "  各维度平均注意力权重:")
-            for col in attention_cols:
-                mean_val = df_output[col].mean()
-                print(f"    {col:20s}: {mean_val:.4f}")
+            attention_lines.append(Fore.CYAN + "  各维度平均注意力权重:" + Style.RESET_ALL)
+            attention_lines.extend(
+                f"    {col:20s}: {mean_val:.4f}" for col, mean_val in df_output[attention_cols].mean().items()
+            )
+        self.write_section("\n【注意力向量统计】", attention_lines)
         
         print(Fore.GREEN + "\n✓ 用户画像外部属性合并完成！")
 
 
 def main():
     """主函数"""
-    merger = PersonaAttributeMerger()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Merge external attributes into persona clusters")
+    parser.add_argument(
+        "--no-csv",
+        action="store_true",
+        help="Only write the Parquet output (skip the CSV copy)"
+    )
+    args = parser.parse_args()
+    
+    merger = PersonaAttributeMerger(write_csv=not args.no_csv)
     merger.run()
 
 
@@ -1,114 +1,156 @@
 import re
-import requests
+import random
+import requests_cache
 import json
 import os
-import time
-import pandas as pd
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 from colorama import Fore, init
-from openpyxl import load_workbook
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
+from token_bucket import TokenBucket
 
 # 初始化 colorama（Windows 兼容）
 init(autoreset=True)
 
+# UserAgent 只初始化一次并预生成 UA 池，每次请求从池中随机取值
+_UA = UserAgent()
+UA_POOL = tuple(_UA.random for _ in range(128))
+
+# Excel 单元格统一使用的对齐样式（模块级共享，openpyxl 只登记一次）
+_WRAP_ALIGN = Alignment(wrap_text=True, vertical='center')
+
+# 批量下载车系配置的并发数与全局请求速率（每秒请求数）
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 2
+
+# 各站点单独使用连接池，池大小与并发线程数一致，避免线程等待或丢弃连接
+POOLED_HOSTS = ("https://car.autohome.com.cn", "https://car-web-api.autohome.com.cn")
+
+# HTTP 响应缓存（SQLite）
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "autohome_cache")
+
+
+def build_session():
+    """创建复用连接（keep-alive）的会话，失败请求由 Retry 按指数退避自动重试最多5次
+
+    响应缓存在本地 SQLite，重复运行时按 ETag/Last-Modified 重新验证，未变化的页面不再重新下载
+    """
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    session = requests_cache.CachedSession(
+        CACHE_PATH,
+        backend='sqlite',
+        expire_after=3600,
+        cache_control=True,
+        allowable_codes=(200,),
+        stale_if_error=True
+    )
+    # 只重试幂等的 GET；403 为反爬拦截也一并重试，并遵守服务端返回的 Retry-After
+    retry = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=(403, 429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for host in POOLED_HOSTS:
+        session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS, max_retries=retry))
+    return session
+
+
+SESSION = build_session()
+
+# 预编译正则
+_RE_WRITELN = re.compile(r'document\.writeln\("(.*)"\)')
+_RE_SERIES_ID = re.compile(r'/price/series-(\d+)\.html')
+_RE_BRAND_ID = re.compile(r'/price/brand-(\d+)\.html')
+
+
+RATE_LIMITER = TokenBucket(REQUESTS_PER_SECOND, MAX_WORKERS)
+
 def get_band_response(brand_id="0"):
     """获取品牌信息的响应"""
-    num = 1
-    while True:
-        headers = {
-            "user-agent": UserAgent().random
-        }
-        url = "https://car.autohome.com.cn/AsLeftMenu/As_LeftListNew.ashx"
-        params = {
-            "typeId": "1",
-            "brandId": brand_id,
-            "fctId": "0",
-            "seriesId": "0"
-        }
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            return response
-        else:
-            if num >= 5:
-                print(Fore.RED + "请求超过5次，退出程序")
-                return None
-            else:
-                print(Fore.YELLOW + "请求失败，正在重新请求...")
-                num += 1
-                time.sleep(1)
+    headers = {
+        "user-agent": random.choice(UA_POOL)
+    }
+    url = "https://car.autohome.com.cn/AsLeftMenu/As_LeftListNew.ashx"
+    params = {
+        "typeId": "1",
+        "brandId": brand_id,
+        "fctId": "0",
+        "seriesId": "0"
+    }
+    RATE_LIMITER.acquire()
+    response = SESSION.get(url, headers=headers, params=params)
+    if response.status_code == 200:
+        return response
+    print(Fore.RED + "请求超过5次，退出程序")
+    return None
 
 def get_response(series_id="0"):
     """获取车系配置信息的响应"""
-    num = 1
-    while True:
-        headers = {
-            "user-agent": UserAgent().random
-        }
-        url = "https://car-web-api.autohome.com.cn/car/param/getParamConf"
-        params = {
-            "mode": "1",
-            "site": "1",
-            "seriesid": series_id
-        }
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            return response
-        else:
-            if num >= 5:
-                print(Fore.RED + "请求超过5次，退出")
-                return None
-            else:
-                print(Fore.YELLOW + "请求失败，正在重新请求...")
-                num += 1
-                time.sleep(1)
+    headers = {
+        "user-agent": random.choice(UA_POOL)
+    }
+    url = "https://car-web-api.autohome.com.cn/car/param/getParamConf"
+    params = {
+        "mode": "1",
+        "site": "1",
+        "seriesid": series_id
+    }
+    RATE_LIMITER.acquire()
+    response = SESSION.get(url, headers=headers, params=params)
+    if response.status_code == 200:
+        return response
+    print(Fore.RED + "请求超过5次，退出")
+    return None
+
+def format_config_value(valueitem):
+    """单个配置项的显示值：优先 itemname，无子项为'-'，否则拼接多值子项"""
+    if valueitem.get('itemname') != '':
+        return valueitem['itemname']
+    sublist = valueitem.get('sublist')
+    if not sublist:
+        return '-'
+    return '\n'.join([multivalue['value'] + multivalue['name'] for multivalue in sublist])
 
 def get_car_config(config_dic):
     """从配置字典中提取车型配置数据"""
-    allconfig = []
-    configname_list = []
-    for title in config_dic['result']['titlelist']:
-        for item in title['items']:
-            configname_list.append(item['itemname'])
-    allconfig.append(configname_list)
-    for data in config_dic['result']['datalist']:
-        configvalue_list = []
-        for valueitem in data['paramconflist']:
-            if valueitem.get('itemname') != '':
-                configvalue_list.append(valueitem['itemname'])
-            elif not valueitem.get('sublist'):
-                configvalue_list.append('-')
-            else:
-                stri = []
-                for multivalue in valueitem['sublist']:
-                    stri.append(multivalue['value'] + multivalue['name'])
-                stro = '\n'.join(stri)
-                configvalue_list.append(stro)
-        allconfig.append(configvalue_list)
-    return allconfig
+    result = config_dic['result']
+    configname_list = [item['itemname'] for title in result['titlelist'] for item in title['items']]
+    return [configname_list] + [
+        [format_config_value(valueitem) for valueitem in data['paramconflist']]
+        for data in result['datalist']
+    ]
 
 def save_to_excel(data, folder, filename):
-    """保存数据到 Excel 文件"""
+    """保存数据到 Excel 文件（write-only 模式逐行写入，转置后每行一个配置项、每列一个车型）"""
     if not os.path.exists(folder):
         os.makedirs(folder)
-    df = pd.DataFrame(data)
     excel_path = os.path.join(folder, filename)
-    df.T.to_excel(excel_path, index=False, header=False)
-    workbook = load_workbook(excel_path)
-    sheet = workbook.active
-    for row in sheet.iter_rows():
-        for cell in row:
-            cell.alignment = Alignment(wrap_text=True, vertical='center')
-    num_columns = df.shape[0]
-    for col in range(1, min(num_columns + 1, 702)):
-        if col <= 26:
-            sheet.column_dimensions[chr(64 + col)].width = 20
-        else:
-            first = chr(64 + (col - 1) // 26)
-            second = chr(64 + (col - 1) % 26 + 1)
-            sheet.column_dimensions[first + second].width = 20
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    # write-only 模式下列宽需在写入数据前设置
+    for col in range(1, len(data) + 1):
+        sheet.column_dimensions[get_column_letter(col)].width = 20
+    for row in zip_longest(*data):
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.alignment = _WRAP_ALIGN
+            cells.append(cell)
+        sheet.append(cells)
     workbook.save(excel_path)
     print(Fore.GREEN + f"✓ 配置下载完成，保存到：{excel_path}\n")
 
@@ -135,9 +177,9 @@ def download_series_config(band, series_id, series_name):
 
 def parse_series(band, response):
     """解析品牌下的车系列表"""
-    html = re.findall(r'document.writeln\("(.*)"\)', response.text)
+    html = _RE_WRITELN.findall(response.text)
     html = "".join(html)
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml")
     data_list = soup.select(".current > dl > dd > a")
     still_sell = [i for i in data_list if "停售" not in i.get_text(strip=True)]
     stop_sell = [i for i in data_list if "停售" in i.get_text(strip=True)]
@@ -151,16 +193,18 @@ def parse_series(band, response):
     for still_index, still_data in enumerate(still_sell, start=1):
         series_name = still_data.contents[0].text.strip()
         href = still_data.get("href")
-        series_id = re.findall(r'/price/series-(\d+).html', href)[0]
+        series_id = _RE_SERIES_ID.search(href).group(1)
         series_dict[series_id] = series_name
         print(f"序号：{still_index}\t车型：{series_name}\t车型id：{series_id}")
     while True:
         choice = input(Fore.YELLOW + "\n请输入需要下载的车型id，输入0则下载该品牌全部车型配置：").strip()
         if choice == "0":
             print(Fore.CYAN + f"\n开始下载 {band} 的所有车型配置...\n")
-            for series_id, series_name in series_dict.items():
-                download_series_config(band, series_id, series_name)
-                time.sleep(2)
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                list(executor.map(
+                    lambda item: download_series_config(band, *item),
+                    series_dict.items()
+                ))
             break
         elif choice in series_dict.keys():
             series_name = series_dict[choice]
@@ -193,7 +237,7 @@ def main():
             continue
         else:
             band_href = band_info.group(1)
-            band_id = re.findall(r'/price/brand-(\d+).html', band_href)[0]
+            band_id = _RE_BRAND_ID.search(band_href).group(1)
             print(Fore.GREEN + f"✓ 找到品牌：{band}，品牌ID：{band_id}")
             print(Fore.CYAN + "正在获取车型列表...")
             resp_brand = get_band_response(brand_id=band_id)
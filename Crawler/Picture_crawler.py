@@ -1,21 +1,51 @@
 import random
-from bs4 import BeautifulSoup
+import asyncio
+import httpx
 from fake_useragent import UserAgent
-import time
+import threading
 from colorama import Fore, init
 import re
-import requests
+import requests_cache
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from token_bucket import TokenBucket
 
 # 初始化colorama
 init(autoreset=True)
 
+# UserAgent 只初始化一次并预生成 UA 池，请求时从池中随机取值
+_UA = UserAgent()
+UA_POOL = tuple(_UA.random for _ in range(128))
+
+# 图片并发下载上限
+MAX_CONCURRENT_DOWNLOADS = 16
+# 待写盘图片队列上限（限制内存中积压的图片数量）
+WRITE_QUEUE_SIZE = 64
+# 写盘线程数
+NUM_WRITERS = 4
+# 同时处理的车型数；对 car.autohome.com.cn 的同时请求数上限（所有车型与分类线程共享）
+MAX_MODEL_WORKERS = 8
+HOST_CONNECTION_LIMIT = 8
+# 全局请求速率（每秒请求数）：分类页面与图片分别限速
+PAGE_REQUESTS_PER_SECOND = 2
+IMAGE_REQUESTS_PER_SECOND = 8
+
+# 预编译正则：提取图片目录与文件名，同时跳过缩略图的尺寸/质量前缀（如 480x360_0_q95_c42_autohomecar__）
+IMAGE_PATH_PATTERN = re.compile(
+    r'//car\d+\.autoimg\.cn/cardfs/product/((?:[^/"]+/){4})(?:\d+x\d+_\d+_q\d+_c\d+_autohomecar__)?([^/"]+?)\.jpg'
+)
+
 
 class PictureCrawler:
     def __init__(self):
+        # 多个车型并发下载时保证输出逐条完整
+        self.print_lock = threading.Lock()
         self.config_path = os.path.join(os.path.dirname(__file__), "config", "car_models.json")
         self.pic_raw_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Data", "Raw","Pic Raw")
+        self.cache_path = os.path.join(os.path.dirname(__file__), "cache", "autohome_cache")
         self.car_models = self.load_config()
         
         # 图片分类映射 (URL中的数字 -> 中文名称)
@@ -25,6 +55,50 @@ class PictureCrawler:
             '3': '车厢座椅',
             '12': '其它细节'
         }
+        
+        self.session = self.build_session()
+        self.host_slots = threading.BoundedSemaphore(HOST_CONNECTION_LIMIT)
+        self.page_limiter = TokenBucket(PAGE_REQUESTS_PER_SECOND, len(self.category_map))
+        self.image_limiter = TokenBucket(IMAGE_REQUESTS_PER_SECOND, IMAGE_REQUESTS_PER_SECOND)
+    
+    def build_session(self):
+        """创建复用 keep-alive 连接的会话；页面响应缓存在本地 SQLite，按 ETag/Last-Modified 重新验证"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        session = requests_cache.CachedSession(
+            self.cache_path,
+            backend='sqlite',
+            expire_after=3600,
+            cache_control=True,
+            allowable_codes=(200,),
+            stale_if_error=True
+        )
+        # 只重试幂等的 GET；限流/服务端错误按指数退避重试，并遵守服务端返回的 Retry-After
+        retry = Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # 车型页与分类页由多个线程并发抓取：该站点单独一个连接池，大小与同时请求数上限一致
+        session.mount(
+            "https://car.autohome.com.cn",
+            HTTPAdapter(pool_connections=1, pool_maxsize=HOST_CONNECTION_LIMIT, max_retries=retry)
+        )
+        session.headers.update({
+            "User-Agent": random.choice(UA_POOL),
+            "Referer": "https://www.autohome.com.cn/cars/"
+        })
+        return session
+    
+    def log(self, message):
+        """线程安全地输出一条日志"""
+        with self.print_lock:
+            print(message)
     
     def load_config(self):
         """加载car_models.json配置文件"""
@@ -32,7 +106,7 @@ class PictureCrawler:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            print(Fore.RED + f"加载配置文件失败: {str(e)}")
+            self.log(Fore.RED + f"加载配置文件失败: {str(e)}")
             return {}
     
     def run(self, brands=None, models=None):
@@ -44,13 +118,14 @@ class PictureCrawler:
         if brands is None:
             brands = list(self.car_models.keys())
         
-        print(Fore.CYAN + f"=" * 60)
-        print(Fore.CYAN + f"开始下载图片，共 {len(brands)} 个品牌")
-        print(Fore.CYAN + f"=" * 60)
+        self.log(Fore.CYAN + f"=" * 60)
+        self.log(Fore.CYAN + f"开始下载图片，共 {len(brands)} 个品牌")
+        self.log(Fore.CYAN + f"=" * 60)
         
+        tasks = []
         for brand in brands:
             if brand not in self.car_models:
-                print(Fore.YELLOW + f"警告: 品牌 '{brand}' 不在配置文件中，跳过")
+                self.log(Fore.YELLOW + f"警告: 品牌 '{brand}' 不在配置文件中，跳过")
                 continue
             
             brand_models = self.car_models[brand]
@@ -62,175 +137,213 @@ class PictureCrawler:
                 target_models = brand_models
             
             if not target_models:
-                print(Fore.YELLOW + f"品牌 '{brand}' 没有要下载的车型，跳过")
+                self.log(Fore.YELLOW + f"品牌 '{brand}' 没有要下载的车型，跳过")
                 continue
             
-            print(Fore.GREEN + f"\n{'=' * 60}")
-            print(Fore.GREEN + f"品牌: {brand}，共 {len(target_models)} 个车型")
-            print(Fore.GREEN + f"{'=' * 60}")
-            
-            for idx, (model_name, series_id) in enumerate(target_models.items(), 1):
-                print(Fore.YELLOW + f"\n[{idx}/{len(target_models)}] 正在下载: {brand} - {model_name} (ID: {series_id})")
-                try:
-                    self.download_model_images(brand, model_name, series_id)
-                except Exception as e:
-                    print(Fore.RED + f"下载失败: {str(e)}")
-                    continue
-        
-        print(Fore.CYAN + f"\n{'=' * 60}")
-        print(Fore.CYAN + "所有下载任务完成！")
-        print(Fore.CYAN + f"{'=' * 60}")
+            self.log(Fore.GREEN + f"品牌: {brand}，共 {len(target_models)} 个车型")
+            tasks.extend((brand, model_name, series_id) for model_name, series_id in target_models.items())
+        
+        # 所有品牌的车型放入同一个线程池并发下载
+        with ThreadPoolExecutor(max_workers=MAX_MODEL_WORKERS) as pool:
+            list(pool.map(
+                lambda item: self.download_model_task(item[0], len(tasks), *item[1]),
+                enumerate(tasks, 1)
+            ))
+        
+        self.log(Fore.CYAN + f"\n{'=' * 60}")
+        self.log(Fore.CYAN + "所有下载任务完成！")
+        self.log(Fore.CYAN + f"{'=' * 60}")
+    
+    def download_model_task(self, idx, total, brand, model_name, series_id):
+        """线程池任务：下载单个车型，异常只记录不中断其他车型"""
+        self.log(Fore.YELLOW + f"\n[{idx}/{total}] 正在下载: {brand} - {model_name} (ID: {series_id})")
+        try:
+            self.download_model_images(brand, model_name, series_id)
+        except Exception as e:
+            self.log(Fore.RED + f"下载失败: {brand} - {model_name} ({str(e)})")
     
     def download_model_images(self, brand, model_name, series_id):
         """下载指定车型的所有图片"""
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Referer": "https://www.autohome.com.cn/cars/"
-        }
-        
         # 访问基础URL获取图片页面链接
         base_url = f"https://car.autohome.com.cn/pic/series/{series_id}.html"
         
         try:
-            response = requests.get(base_url, headers=headers, timeout=10)
+            with self.host_slots:
+                response = self.session.get(base_url, timeout=10)
             if response.status_code != 200:
-                print(Fore.RED + f"  页面访问失败，状态码: {response.status_code}")
+                self.log(Fore.RED + f"  页面访问失败，状态码: {response.status_code}")
                 return
             
             # 解析页面获取各分类的图片链接
             all_images = self.parse_main_page(response.text, series_id)
             
             if not all_images:
-                print(Fore.YELLOW + "  未找到图片")
+                self.log(Fore.YELLOW + "  未找到图片")
                 return
             
             # 创建保存目录
             folder_path = os.path.join(self.pic_raw_folder, brand, model_name)
             os.makedirs(folder_path, exist_ok=True)
-            print(Fore.CYAN + f"  保存路径: {folder_path}")
-            
-            # 下载所有分类的图片
-            total_success = 0
-            total_skip = 0
-            total_fail = 0
+            self.log(Fore.CYAN + f"  保存路径: {folder_path}")
             
+            # 并发下载所有分类的图片
             for category, images in all_images.items():
-                print(Fore.CYAN + f"\n  正在下载: {category} (共 {len(images)} 张)")
-                success, skip, fail = self.download_category_images(images, folder_path, category)
-                total_success += success
-                total_skip += skip
-                total_fail += fail
+                self.log(Fore.CYAN + f"\n  正在下载: {category} (共 {len(images)} 张)")
+            results = asyncio.run(self.download_all_images(all_images, folder_path))
+            total_success = sum(success for success, _, _ in results)
+            total_skip = sum(skip for _, skip, _ in results)
+            total_fail = sum(fail for _, _, fail in results)
             
-            print(Fore.GREEN + f"\n  总计 - 成功:{total_success}, 跳过:{total_skip}, 失败:{total_fail}")
+            self.log(Fore.GREEN + f"\n  {brand} - {model_name} 总计 - 成功:{total_success}, 跳过:{total_skip}, 失败:{total_fail}")
             
         except Exception as e:
-            print(Fore.RED + f"  错误: {str(e)}")
+            self.log(Fore.RED + f"  错误: {str(e)}")
     
     def parse_main_page(self, html_content, series_id):
-        """解析主页面获取各分类的图片链接"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        """解析主页面获取各分类的图片链接（各分类页面由线程池一次并发抓取）"""
         all_images = {}
         
-        # 尝试按分类链接提取图片
-        for category_id, category_name in self.category_map.items():
-            # 查找该分类的链接
-            category_url = f"https://car.autohome.com.cn/pic/series/{series_id}-{category_id}.html"
+        with ThreadPoolExecutor(max_workers=len(self.category_map)) as pool:
+            results = pool.map(
+                lambda item: self.fetch_category_images(series_id, *item),
+                self.category_map.items()
+            )
+            for category_name, unique_images in zip(self.category_map.values(), results):
+                if unique_images:
+                    all_images[category_name] = unique_images
+                    self.log(Fore.WHITE + f"  {category_name}: 找到 {len(unique_images)} 张图片")
+        
+        return all_images
+    
+    def fetch_category_images(self, series_id, category_id, category_name):
+        """抓取单个分类页面并提取去重后的图片路径（最多8张）"""
+        # 查找该分类的链接
+        category_url = f"https://car.autohome.com.cn/pic/series/{series_id}-{category_id}.html"
+        
+        try:
+            self.page_limiter.acquire()
+            with self.host_slots:
+                response = self.session.get(category_url, headers={"User-Agent": random.choice(UA_POOL)}, timeout=10)
             
-            try:
-                headers = {
-                    "User-Agent": UserAgent().random,
-                    "Referer": "https://www.autohome.com.cn/cars/"
-                }
-                response = requests.get(category_url, headers=headers, timeout=10)
-                
-                if response.status_code == 200:
-                    # 匹配格式: //car2.autoimg.cn/cardfs/product/g31/M08/EA/81/480x360_0_q95_c42_autohomecar__ChtlyGet8LWAbBPDACaN7q7J4Es934.jpg
-                    # 需要提取为: cardfs/product/g31/M08/EA/81/ChxpVml62RuAQGEvAB2TGuXSfcA358.jpg (去掉尺寸质量参数)
-                    
-                    # 方法1: 提取完整路径再清洗
-                    pattern = re.compile(r'//car\d+\.autoimg\.cn/cardfs/product/([^"]+?)\.jpg')
-                    matches = pattern.findall(response.text)
-                    
-                    # 清洗图片路径: 去掉 480x360_0_q95_c42_autohomecar__ 这样的前缀
-                    cleaned_images = []
-                    for match in matches:
-                        # 分离路径部分和文件名部分
-                        # 例如: g31/M08/EA/81/480x360_0_q95_c42_autohomecar__ChtlyGet8LWAbBPDACaN7q7J4Es934
-                        parts = match.split('/')
-                        if len(parts) >= 5:
-                            # 获取目录部分: g31/M08/EA/81
-                            path_parts = parts[:4]
-                            # 获取文件名部分并清理
-                            filename = parts[-1]
-                            # 去掉尺寸和质量参数 (格式: 480x360_0_q95_c42_autohomecar__)
-                            cleaned_filename = re.sub(r'^\d+x\d+_\d+_q\d+_c\d+_autohomecar__', '', filename)
-                            
-                            # 重组完整路径
-                            clean_path = '/'.join(path_parts) + '/' + cleaned_filename
-                            cleaned_images.append(clean_path)
-                    
-                    # 去重并限制为8张
-                    unique_images = list(dict.fromkeys(cleaned_images))[:8]
-                    
-                    if unique_images:
-                        all_images[category_name] = unique_images
-                        print(Fore.WHITE + f"  {category_name}: 找到 {len(unique_images)} 张图片")
-                    
-                    time.sleep(random.uniform(1, 2))
+            if response.status_code != 200:
+                return []
             
-            except Exception as e:
-                print(Fore.YELLOW + f"  {category_name} 解析失败: {str(e)}")
-                continue
+            # 匹配格式: //car2.autoimg.cn/cardfs/product/g31/M08/EA/81/480x360_0_q95_c42_autohomecar__ChtlyGet8LWAbBPDACaN7q7J4Es934.jpg
+            # 需要提取为: cardfs/product/g31/M08/EA/81/ChxpVml62RuAQGEvAB2TGuXSfcA358.jpg (去掉尺寸质量参数)
+            
+            # 一次匹配同时取出目录部分(g31/M08/EA/81/)与去掉尺寸质量前缀后的文件名
+            cleaned_images = [directory + filename for directory, filename in IMAGE_PATH_PATTERN.findall(response.text)]
+            
+            # 去重并限制为8张
+            return list(dict.fromkeys(cleaned_images))[:8]
         
-        return all_images
+        except Exception as e:
+            self.log(Fore.YELLOW + f"  {category_name} 解析失败: {str(e)}")
+            return []
+    
+    async def download_all_images(self, all_images, folder_path):
+        """在同一个 HTTP/2 客户端中并发下载所有分类的图片，返回各分类的 (成功, 跳过, 失败)
+
+        图片 CDN 支持 h2 时所有请求在同一连接上多路复用，否则自动回退到 HTTP/1.1
+        """
+        # 保持的空闲连接数与并发下载数一致，每个下载协程都能复用已建立的连接
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=MAX_CONCURRENT_DOWNLOADS)
+        # 只设置 UA/Referer：HTTP/2 不允许 Connection 等逐跳首部；与 requests 一样跟随 CDN 的重定向
+        headers = {"User-Agent": random.choice(UA_POOL), "Referer": self.session.headers["Referer"]}
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        # 下载协程只负责取数据放入队列，写盘交给线程池，网络与磁盘 I/O 相互重叠
+        write_queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=NUM_WRITERS) as executor:
+            writers = [
+                asyncio.create_task(self.image_writer(write_queue, loop, executor))
+                for _ in range(NUM_WRITERS)
+            ]
+            async with httpx.AsyncClient(
+                http2=True, limits=limits, timeout=10, headers=headers, follow_redirects=True
+            ) as session:
+                results = await asyncio.gather(*[
+                    self.download_category_images(session, semaphore, write_queue, images, folder_path, category)
+                    for category, images in all_images.items()
+                ])
+            # 通知写盘协程结束并等待队列清空
+            for _ in writers:
+                await write_queue.put(None)
+            await asyncio.gather(*writers)
+        return results
+    
+    async def image_writer(self, write_queue, loop, executor):
+        """消费写盘队列，在线程池中把图片写入磁盘，并通过 future 把写盘结果告知下载协程"""
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                return
+            file_path, content, written = item
+            try:
+                await loop.run_in_executor(executor, write_file, file_path, content)
+                written.set_result(True)
+            except Exception as e:
+                self.log(Fore.RED + f"    写入失败: {os.path.basename(file_path)} ({str(e)})")
+                written.set_result(False)
     
-    def download_category_images(self, image_paths, folder_path, category):
+    async def download_category_images(self, session, semaphore, write_queue, image_paths, folder_path, category):
         """下载某个分类的图片"""
-        success_count = 0
-        skip_count = 0
-        fail_count = 0
-        
         # 创建分类文件夹
         category_folder = os.path.join(folder_path, category)
         os.makedirs(category_folder, exist_ok=True)
+        # 一次 scandir 取得已有文件名，之后用集合判断是否已下载
+        with os.scandir(category_folder) as entries:
+            existing = {entry.name for entry in entries}
         
-        for idx, img_path in enumerate(image_paths, 1):
-            # 构造原图URL
-            # img_path 格式: g31/M08/EA/81/ChtlyGet8LWAbBPDACaN7q7J4Es934
-            # 需要构造: https://car2.autoimg.cn/cardfs/product/g31/M08/EA/81/ChtlyGet8LWAbBPDACaN7q7J4Es934.jpg
-            img_url = f"https://car2.autoimg.cn/cardfs/product/{img_path}.jpg"
-            
-            # 生成文件名: 分类_序号.jpg
-            filename = f"{category}_{idx:02d}.jpg"
-            file_path = os.path.join(category_folder, filename)
-            
-            # 检查是否已存在
-            if os.path.exists(file_path):
-                skip_count += 1
-                continue
-            
-            # 下载图片
+        results = await asyncio.gather(*[
+            self.download_image(session, semaphore, write_queue, existing, img_path, idx, len(image_paths), category_folder, category)
+            for idx, img_path in enumerate(image_paths, 1)
+        ])
+        return results.count('success'), results.count('skip'), results.count('fail')
+    
+    async def download_image(self, session, semaphore, write_queue, existing, img_path, idx, total, category_folder, category):
+        """下载单张图片，返回 'success' / 'skip' / 'fail'"""
+        # 构造原图URL
+        # img_path 格式: g31/M08/EA/81/ChtlyGet8LWAbBPDACaN7q7J4Es934
+        # 需要构造: https://car2.autoimg.cn/cardfs/product/g31/M08/EA/81/ChtlyGet8LWAbBPDACaN7q7J4Es934.jpg
+        img_url = f"https://car2.autoimg.cn/cardfs/product/{img_path}.jpg"
+        
+        # 生成文件名: 分类_序号.jpg
+        filename = f"{category}_{idx:02d}.jpg"
+        file_path = os.path.join(category_folder, filename)
+        
+        # 检查是否已存在
+        if filename in existing:
+            return 'skip'
+        
+        # 下载图片（信号量限制并发数，令牌桶限制全局请求速率）
+        async with semaphore:
             try:
-                headers = {"User-Agent": UserAgent().random}
-                response = requests.get(img_url, headers=headers, stream=True, timeout=10)
-                
-                if response.status_code == 200:
-                    with open(file_path, 'wb') as f:
-                        for chunk in response.iter_content(1024):
-                            f.write(chunk)
-                    success_count += 1
-                    print(Fore.WHITE + f"    [{idx}/{len(image_paths)}] 下载成功: {filename}")
-                else:
-                    fail_count += 1
-                    print(Fore.RED + f"    [{idx}/{len(image_paths)}] 下载失败: {filename} (状态码:{response.status_code})")
-                
-                time.sleep(random.uniform(0.5, 1.5))
+                await self.image_limiter.acquire_async()
+                response = await session.get(img_url)
+                if response.status_code != 200:
+                    self.log(Fore.RED + f"    [{idx}/{total}] 下载失败: {filename} (状态码:{response.status_code})")
+                    return 'fail'
+                # 队列满时在此等待，限制内存中未写盘的图片数量
+                written = asyncio.get_running_loop().create_future()
+                await write_queue.put((file_path, response.content, written))
             
             except Exception as e:
-                fail_count += 1
-                print(Fore.RED + f"    [{idx}/{len(image_paths)}] 下载失败: {filename} ({str(e)})")
+                self.log(Fore.RED + f"    [{idx}/{total}] 下载失败: {filename} ({str(e)})")
+                return 'fail'
         
-        return success_count, skip_count, fail_count
+        # 在信号量外等待写盘结果，不占用下载并发名额；写盘失败计为失败
+        if not await written:
+            return 'fail'
+        existing.add(filename)
+        self.log(Fore.WHITE + f"    [{idx}/{total}] 下载成功: {filename}")
+        return 'success'
+
+
+def write_file(file_path, content):
+    """把图片内容写入磁盘（在写盘线程中执行）"""
+    with open(file_path, 'wb') as f:
+        f.write(content)
 
 
 if __name__ == '__main__':
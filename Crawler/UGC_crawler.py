@@ -1,44 +1,125 @@
 """
 汽车之家UGC口碑爬虫 
 功能:
-1. 按厂商分类保存CSV文件
+1. 按厂商分类保存CSV文件(可选Parquet格式)
 2. 从外部JSON配置文件读取车型ID
 3. 智能验证车型ID匹配
 4. 自动创建输出目录
+5. 已抓取的口碑链接自动跳过,支持中断后增量续抓
 """
 
 import json
 import os
+import re
 import csv
+import io
+import codecs
 import time
-import random
+from datetime import timedelta
+from itertools import islice
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
-from bs4 import BeautifulSoup
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+from selectolax.lexbor import LexborHTMLParser
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from token_bucket import TokenBucket
+
 
 class CarReviewCrawler:
     
     # 评论分类
     COMMENT_CATEGORIES = ['空间', '驾驶感受', '续航', '外观', '内饰', '价格政策', '性价比', '智能化']
+    COMMENT_CATEGORY_SET = frozenset(COMMENT_CATEGORIES)
+    
+    # 基本信息字段
+    BASIC_INFO_KEYS = ('行驶里程', '春秋电耗', '春秋续航', '夏季电耗', '夏季续航',
+                       '冬季电耗', '冬季续航', '裸车购买价', '购买时间', '购买地点')
+    BASIC_INFO_KEY_SET = frozenset(BASIC_INFO_KEYS)
+    
+    # 发布时间取 span 文本中的第一个非空白片段(日期),省去 strip/split
+    FIRST_TOKEN_RE = re.compile(r'\S+')
+    
+    # 详情页评分条目选择器;条目内标题、星级、评价文本合并为一个选择器,一次遍历取出
+    KB_ITEM_SELECTOR = 'div.space.kb-item'
+    KB_ITEM_PARTS_SELECTOR = 'h1, span.star-num, p.kb-item-msg'
+    
+    # 单条口碑的行模板(含各字段默认值),每条口碑复制一份再填充;字段顺序即CSV表头顺序
+    ROW_TEMPLATE = {
+        '抓取车型': None,
+        '实际型号': None,
+        **dict.fromkeys(BASIC_INFO_KEYS),
+        '评论发布时间': '未知',
+        **{key: '暂无' for category in COMMENT_CATEGORIES for key in (f'{category}评分评价', f'{category}评分')},
+        '最满意': None,
+        '最不满意': None,
+        '购物目标': None,
+        '口碑链接': None
+    }
+    FIELDNAMES = tuple(ROW_TEMPLATE)
+    
+    # 列表页预编译 XPath:口碑条目、条目内详情链接、条目内对比车型
+    LIST_ITEM_XPATH = etree.XPath("//li[contains(concat(' ', normalize-space(@class), ' '), ' clearfix ')]")
+    ITEM_LINK_XPATH = etree.XPath("(.//li[contains(concat(' ', normalize-space(@class), ' '), ' list_jump__ieH_F ')]//a)[1]/@href")
+    ITEM_TARGETS_XPATH = etree.XPath(".//li[contains(concat(' ', normalize-space(@class), ' '), ' list_target__76fWs ')]")
+    
+    # 浏览器中一次脚本调用同时检查页面加载完成与口碑链接存在;一次调用取回整页HTML
+    LIST_READY_SCRIPT = "return document.readyState === 'complete' && !!document.querySelector('.list_jump__ieH_F')"
+    OUTER_HTML_SCRIPT = "return document.documentElement.outerHTML"
+    
+    # 详情页并发抓取线程数;所有HTTP请求共享的全局速率(每秒请求数)与突发上限
+    DETAIL_WORKERS = 8
+    REQUESTS_PER_SECOND = 1.5
+    REQUEST_BURST = 3
+    
+    # 详情页流式读取的分块大小与读取上限(2MB),超出部分丢弃
+    DETAIL_CHUNK_SIZE = 64 * 1024
+    DETAIL_MAX_CHUNKS = (2 << 20) // DETAIL_CHUNK_SIZE
     
-    def __init__(self, config_path='config/car_models.json', output_dir='../Data/Raw/UGC Raw'):
+    # 页面缓存有效期:车型首页基本不变,列表页会出现新口碑
+    # 详情页不缓存(已抓取的口碑由 seen_urls 跳过),以保留流式读取的大小上限
+    CACHE_EXPIRE_AFTER = timedelta(days=30)
+    LISTING_CACHE_EXPIRE_AFTER = timedelta(hours=1)
+    # 只缓存包含口碑链接的真实页面,状态码为200的反爬/验证码页面不写入缓存
+    CACHEABLE_PAGE_MARKER = b'list_jump__ieH_F'
+    
+    # CSV 写缓冲大小与强制落盘间隔(行数)
+    CSV_BUFFER_SIZE = 1 << 20
+    CSV_FLUSH_ROWS = 50
+    
+    # Parquet 输出:所有字段按原始文本保存(评分含'暂无'等非数值),每满一批写入一个 row group
+    OUTPUT_FORMATS = ('csv', 'parquet')
+    PARQUET_SCHEMA = pa.schema([(name, pa.string()) for name in FIELDNAMES])
+    PARQUET_BATCH_ROWS = 500
+    
+    def __init__(self, config_path='config/car_models.json', output_dir='../Data/Raw/UGC Raw', output_format='csv'):
         """
         初始化爬虫
         
         Args:
             config_path: 车型配置文件路径(相对于当前脚本)
             output_dir: 输出目录路径(相对于当前脚本)
+            output_format: 输出格式,'csv'(默认)或 'parquet'(每次运行每个厂商写一个新文件)
         """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+        self.output_format = output_format
+        self.run_tag = time.strftime('%Y%m%d_%H%M%S')
+        
         self.script_dir = Path(__file__).parent
         self.config_path = self.script_dir / config_path
         self.output_dir = self.script_dir / output_dir
+        self.cache_path = self.script_dir / 'cache' / 'autohome_reviews'
         
         # 加载配置
         self.car_models = self._load_config()
@@ -49,6 +130,23 @@ class CarReviewCrawler:
         # 统计信息
         self.total_count = 0
         
+        # 已保存过的口碑链接(从已有CSV加载),重复运行时跳过
+        self.seen_urls = self._load_seen_urls()
+        
+        # 首页/列表页使用带缓存的会话;详情页使用不缓存的会话(keep-alive),避免每篇口碑重新建立 TCP/TLS 连接
+        self.session = self._build_session()
+        self.detail_session = self._mount_adapter(requests.Session())
+        # 令牌在请求进行期间持续补充,上一个请求耗时越长,下一个请求需要等待的时间越短
+        self.rate_limiter = TokenBucket(self.REQUESTS_PER_SECOND, self.REQUEST_BURST)
+        
+        # 浏览器只在直接请求被拦截(验证码)时按需启动,所有车型共用一个实例
+        self.driver = None
+        
+        # 每个CSV文件只打开一次: {csv_file: [文件对象, DictWriter, 未落盘行数]}
+        self._writers = {}
+        # 每个厂商的Parquet写入器: {厂商: [ParquetWriter, 待写入行列表]}
+        self._parquet_writers = {}
+        
     def _load_config(self):
         """加载车型配置文件"""
         try:
@@ -61,10 +159,193 @@ class CarReviewCrawler:
             print(f"错误: 配置文件格式错误 {e}")
             raise
     
+    def _load_seen_urls(self):
+        """
+        从输出目录已有的CSV中读取已抓取的口碑链接
+        
+        Returns:
+            set: 口碑链接集合(旧版本CSV没有链接列时为空)
+        """
+        seen_urls = set()
+        for csv_file in self.output_dir.glob('*_口碑数据.csv'):
+            with open(csv_file, newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                if '口碑链接' not in (reader.fieldnames or ()):
+                    continue
+                seen_urls.update(row['口碑链接'] for row in reader if row['口碑链接'])
+        for parquet_file in self.output_dir.glob('*_口碑数据_*.parquet'):
+            if '口碑链接' not in pq.read_schema(parquet_file).names:
+                continue
+            urls = pq.read_table(parquet_file, columns=['口碑链接']).column(0).to_pylist()
+            seen_urls.update(url for url in urls if url)
+        return seen_urls
+    
+    def _build_session(self):
+        """
+        创建带连接池、失败重试和本地响应缓存(SQLite)的会话(用于车型首页与列表页)
+        
+        重复运行时已缓存的页面直接从本地读取;列表页缓存时间较短,以便发现新口碑
+        """
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        session = requests_cache.CachedSession(
+            str(self.cache_path),
+            backend='sqlite',
+            expire_after=self.CACHE_EXPIRE_AFTER,
+            urls_expire_after={'k.autohome.com.cn/*/index_*': self.LISTING_CACHE_EXPIRE_AFTER},
+            allowable_codes=(200,),
+            filter_fn=self._is_cacheable_page,
+            stale_if_error=True
+        )
+        return self._mount_adapter(session)
+    
+    def _is_cacheable_page(self, response):
+        """
+        判断响应是否写入缓存
+        
+        Args:
+            response: 请求响应
+            
+        Returns:
+            bool: 页面包含口碑链接时为True(反爬/验证码页面即使状态码为200也不缓存)
+        """
+        return self.CACHEABLE_PAGE_MARKER in response.content
+    
+    def _mount_adapter(self, session):
+        """
+        为会话挂载连接池与失败重试,并设置请求头
+        
+        Args:
+            session: requests 会话
+            
+        Returns:
+            会话本身
+        """
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        session.mount('https://', adapter)
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        return session
+    
+    def close(self):
+        """关闭所有输出文件、浏览器与会话,释放连接池"""
+        self._close_writers()
+        self._close_parquet_writers()
+        self._quit_driver()
+        self.session.close()
+        self.detail_session.close()
+    
+    def _get_driver(self):
+        """获取浏览器实例,首次使用时启动(不加载图片,减少页面流量)"""
+        if self.driver is None:
+            options = webdriver.ChromeOptions()
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_argument('--disable-gpu')
+            self.driver = webdriver.Chrome(options=options)
+        return self.driver
+    
+    def _quit_driver(self):
+        """关闭浏览器(未启动则忽略)"""
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+    
+    def _request_html(self, url):
+        """
+        直接请求页面HTML(不经过浏览器)
+        
+        Args:
+            url: 页面URL
+            
+        Returns:
+            str: 页面HTML,请求失败返回None
+        """
+        try:
+            with self.rate_limiter:
+                response = self.session.get(url, timeout=10)
+            if response.status_code != 200:
+                return None
+            return response.content.decode('utf-8', errors='replace')
+        except requests.RequestException:
+            return None
+    
+    def _get_writer(self, csv_file):
+        """
+        获取CSV文件对应的写入器,首次使用时打开文件(新文件写入表头)
+        
+        Args:
+            csv_file: CSV文件路径
+            
+        Returns:
+            list: [文件对象, DictWriter, 未落盘行数]
+        """
+        entry = self._writers.get(csv_file)
+        if entry is None:
+            is_new = not csv_file.exists() or csv_file.stat().st_size == 0
+            # 追加到已有文件时沿用其表头,旧文件中没有的列(如口碑链接)不写入,保证列对齐
+            fieldnames = self.FIELDNAMES
+            if not is_new:
+                with open(csv_file, newline='', encoding='utf-8-sig') as existing:
+                    fieldnames = next(csv.reader(existing), None) or self.FIELDNAMES
+            # 以二进制追加方式打开,BOM 只在新文件开头写一次,再包装为 UTF-8 文本流
+            raw = open(csv_file, mode='ab', buffering=self.CSV_BUFFER_SIZE)
+            if is_new:
+                raw.write(codecs.BOM_UTF8)
+            f = io.TextIOWrapper(raw, encoding='utf-8', newline='', write_through=False)
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            if is_new:
+                writer.writeheader()
+            entry = self._writers[csv_file] = [f, writer, 0]
+        return entry
+    
+    def _close_writer(self, csv_file):
+        """关闭单个CSV文件(关闭时自动落盘),未打开过则忽略"""
+        entry = self._writers.pop(csv_file, None)
+        if entry is not None:
+            entry[0].close()
+    
+    def _close_writers(self):
+        """关闭所有已打开的CSV文件"""
+        for csv_file in list(self._writers):
+            self._close_writer(csv_file)
+    
     def _get_csv_filename(self, brand):
         """获取厂商对应的CSV文件名"""
         return self.output_dir / f"{brand}_口碑数据.csv"
     
+    def _get_parquet_filename(self, brand):
+        """获取厂商本次运行对应的Parquet文件名(Parquet 不支持追加,每次运行单独一个文件)"""
+        return self.output_dir / f"{brand}_口碑数据_{self.run_tag}.parquet"
+    
+    def _get_output_filename(self, brand):
+        """获取厂商对应的输出文件名"""
+        if self.output_format == 'parquet':
+            return self._get_parquet_filename(brand)
+        return self._get_csv_filename(brand)
+    
+    def _flush_parquet(self, entry):
+        """把缓冲的行作为一个 row group 写入Parquet文件"""
+        writer, rows = entry
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=self.PARQUET_SCHEMA))
+            rows.clear()
+    
+    def _close_parquet_writer(self, brand):
+        """写入剩余数据并关闭厂商的Parquet文件,未打开过则忽略"""
+        entry = self._parquet_writers.pop(brand, None)
+        if entry is not None:
+            self._flush_parquet(entry)
+            entry[0].close()
+    
+    def _close_parquet_writers(self):
+        """关闭所有已打开的Parquet文件"""
+        for brand in list(self._parquet_writers):
+            self._close_parquet_writer(brand)
+    
     def scrape_review_detail(self, review_url, shopping_targets, model_name):
         """
         抓取单篇口碑详情页的数据
@@ -78,105 +359,88 @@ class CarReviewCrawler:
             dict: 提取的口碑数据,失败返回None
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(review_url, headers=headers, timeout=10)
-            response.raise_for_status()
+            # 不经过缓存流式读取并限制大小,with 保证连接读完后归还连接池
+            with self.rate_limiter, self.detail_session.get(review_url, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                content = b''.join(islice(response.iter_content(self.DETAIL_CHUNK_SIZE), self.DETAIL_MAX_CHUNKS))
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # 详情页只做少量固定标签查找,用 Lexbor 解析器
+            tree = LexborHTMLParser(content.decode('utf-8', errors='replace'))
             
             # 验证详情页
-            title_div = soup.find('div', class_='subnav-title-name')
+            title_div = tree.css_first('div.subnav-title-name')
             if not title_div:
                 return None
             
-            title = title_div.text.strip()
+            title = title_div.text().strip()
             
-            # 初始化数据字典
-            car_data = {
-                '抓取车型': model_name,
-                '实际型号': title
-            }
+            # 从行模板复制数据字典(基本信息、发布时间、评分字段已带默认值)
+            car_data = self.ROW_TEMPLATE.copy()
+            car_data['抓取车型'] = model_name
+            car_data['实际型号'] = title
             
             # 1. 提取基本信息
-            kb_con = soup.find('div', class_='kb-con')
+            kb_con = tree.css_first('div.kb-con')
             if kb_con:
-                ul_items = kb_con.find('ul').find_all('li')
-                basic_info = {
-                    '行驶里程': None,
-                    '春秋电耗': None,
-                    '春秋续航': None,
-                    '夏季电耗': None,
-                    '夏季续航': None,
-                    '冬季电耗': None,
-                    '冬季续航': None,
-                    '裸车购买价': None,
-                    '购买时间': None,
-                    '购买地点': None
-                }
-                
-                for li_item in ul_items:
+                for li_item in kb_con.css_first('ul').css('li'):
                     try:
-                        header = li_item.find('div', class_='name').text.strip()
-                        value = li_item.find('div', class_='key').text.strip()
-                        if header in basic_info:
-                            basic_info[header] = value
+                        header = li_item.css_first('div.name').text().strip()
+                        value = li_item.css_first('div.key').text().strip()
+                        if header in self.BASIC_INFO_KEY_SET:
+                            car_data[header] = value
                     except AttributeError:
                         continue
-                
-                car_data.update(basic_info)
             
             # 2. 提取发布时间
-            timeline = soup.find('div', class_='timeline-con')
+            timeline = tree.css_first('div.timeline-con')
             if timeline:
-                comment_time = timeline.find('span').text.strip().split(' ')[0]
-                car_data['评论发布时间'] = comment_time
-            else:
-                car_data['评论发布时间'] = '未知'
-            
-            # 3. 初始化评分字段
-            for category in self.COMMENT_CATEGORIES:
-                car_data[f'{category}评分评价'] = '暂无'
-                car_data[f'{category}评分'] = '暂无'
+                match = self.FIRST_TOKEN_RE.search(timeline.css_first('span').text())
+                if match:
+                    car_data['评论发布时间'] = match.group(0)
             
-            # 4. 提取评分和评价
-            ratings = soup.find_all('div', class_='space kb-item')
+            # 3. 提取评分和评价
+            ratings = tree.css(self.KB_ITEM_SELECTOR)
             
             count = 0
             for rating in ratings:
                 count += 1
                 
+                # 按标签名收集各部分(每种只取第一个): h1 / span(star-num) / p(kb-item-msg)
+                parts = {}
+                for node in rating.css(self.KB_ITEM_PARTS_SELECTOR):
+                    parts.setdefault(node.tag, node)
+                
                 # 前两个是"最满意"和"最不满意"
                 if count < 3:
-                    review_text = rating.find('p', class_='kb-item-msg').text.strip()
+                    review_text = parts['p'].text().strip()
                     key = '最满意' if count == 1 else '最不满意'
                     car_data[key] = review_text
                     continue
                 
                 # 后续是各个分类评分
-                h1_tag = rating.find('h1')
+                h1_tag = parts.get('h1')
                 if not h1_tag:
                     continue
                 
-                cat_raw = h1_tag.text.strip().split()
-                if not cat_raw or cat_raw[0] not in self.COMMENT_CATEGORIES:
+                cat_raw = h1_tag.text().strip().split()
+                if not cat_raw or cat_raw[0] not in self.COMMENT_CATEGORY_SET:
                     continue
                 
                 cat_name = cat_raw[0]
                 
                 # 提取星级
-                stars_span = rating.find('span', class_='star-num')
-                stars = stars_span.text.strip() if stars_span else '0'
+                stars_span = parts.get('span')
+                stars = stars_span.text().strip() if stars_span else '0'
                 car_data[f'{cat_name}评分'] = stars
                 
                 # 提取评价文本
-                msg_p = rating.find('p', class_='kb-item-msg')
-                review_text = msg_p.text.strip() if msg_p else ''
+                msg_p = parts.get('p')
+                review_text = msg_p.text().strip() if msg_p else ''
                 car_data[f'{cat_name}评分评价'] = review_text
             
-            # 5. 添加对比车型
+            # 4. 添加对比车型与口碑链接
             car_data['购物目标'] = shopping_targets
+            car_data['口碑链接'] = review_url
             
             return car_data
         
@@ -184,6 +448,43 @@ class CarReviewCrawler:
             # print(f"详情页抓取异常: {e}")
             return None
     
+    def save_record(self, data, brand):
+        """
+        按输出格式保存一条口碑数据
+        
+        Args:
+            data: 数据字典
+            brand: 厂商名称
+        """
+        if self.output_format == 'parquet':
+            self.save_to_parquet(data, brand)
+        else:
+            self.save_to_csv(data, self._get_csv_filename(brand))
+    
+    def save_to_parquet(self, data, brand):
+        """
+        缓冲一条数据,每满 PARQUET_BATCH_ROWS 行写入一次Parquet文件
+        
+        Args:
+            data: 数据字典
+            brand: 厂商名称
+        """
+        if not data:
+            return
+        
+        entry = self._parquet_writers.get(brand)
+        if entry is None:
+            writer = pq.ParquetWriter(self._get_parquet_filename(brand), self.PARQUET_SCHEMA, compression='zstd')
+            entry = self._parquet_writers[brand] = [writer, []]
+        
+        # 处理列表类型的字段
+        if isinstance(data.get('购物目标'), list):
+            data['购物目标'] = ', '.join(data['购物目标'])
+        
+        entry[1].append(data)
+        if len(entry[1]) >= self.PARQUET_BATCH_ROWS:
+            self._flush_parquet(entry)
+    
     def save_to_csv(self, data, csv_file):
         """
         保存数据到CSV文件
@@ -195,35 +496,82 @@ class CarReviewCrawler:
         if not data:
             return
         
-        # 检查文件是否存在
-        file_exists = csv_file.exists()
+        entry = self._get_writer(csv_file)
+        f, writer, _ = entry
+        
+        # 处理列表类型的字段
+        if isinstance(data.get('购物目标'), list):
+            data['购物目标'] = ', '.join(data['购物目标'])
         
-        with open(csv_file, mode='a', newline='', encoding='utf-8-sig') as f:
-            fieldnames = list(data.keys())
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writerow(data)
+        
+        # 每写入一定行数落盘一次,中途中断时最多丢失缓冲中的少量数据
+        entry[2] += 1
+        if entry[2] >= self.CSV_FLUSH_ROWS:
+            f.flush()
+            entry[2] = 0
+    
+    def get_page_title(self, url):
+        """
+        获取车型首页标题: 优先直接请求解析<title>,失败时回退到浏览器
+        
+        Args:
+            url: 车型口碑首页URL
             
-            # 如果是新文件,写入表头
-            if not file_exists:
-                writer.writeheader()
+        Returns:
+            str: 页面标题
+        """
+        html = self._request_html(url)
+        if html:
+            title_tag = LexborHTMLParser(html).css_first('title')
+            if title_tag:
+                return title_tag.text().strip()
+        
+        driver = self._get_driver()
+        driver.get(url)
+        time.sleep(3)
+        return driver.title
+    
+    def get_listing_html(self, page_url, first_page):
+        """
+        获取口碑列表页HTML: 优先直接请求,页面中没有口碑链接(被拦截)时回退到浏览器
+        
+        Args:
+            page_url: 列表页URL
+            first_page: 是否为第一页(第一页加载失败时尝试人工处理验证码)
             
-            # 处理列表类型的字段
-            if isinstance(data.get('购物目标'), list):
-                data['购物目标'] = ', '.join(data['购物目标'])
+        Returns:
+            str: 页面HTML,加载失败返回None
+        """
+        html = self._request_html(page_url)
+        if html and 'list_jump__ieH_F' in html:
+            return html
+        
+        driver = self._get_driver()
+        driver.get(page_url)
+        try:
+            # 等待列表加载
+            WebDriverWait(driver, 5).until(lambda d: d.execute_script(self.LIST_READY_SCRIPT))
+        except TimeoutException:
+            print(f"列表加载超时")
             
-            writer.writerow(data)
+            # 首页加载失败可能是验证码
+            if not first_page or not self.handle_captcha(driver):
+                return None
+        
+        return driver.execute_script(self.OUTER_HTML_SCRIPT)
     
-    def verify_page_title(self, driver, model_name):
+    def verify_page_title(self, current_title, model_name):
         """
         验证页面标题是否匹配车型
         
         Args:
-            driver: Selenium WebDriver
+            current_title: 页面标题
             model_name: 车型名称
             
         Returns:
             bool: 是否匹配
         """
-        current_title = driver.title
         print(f"当前网页标题: [{current_title}]")
         
         # 提取车名关键字(取下划线前的部分,再取前2个字)
@@ -251,7 +599,7 @@ class CarReviewCrawler:
         
         try:
             wait = WebDriverWait(driver, 5)
-            wait.until(EC.presence_of_element_located((By.CLASS_NAME, 'list_jump__ieH_F')))
+            wait.until(lambda d: d.execute_script(self.LIST_READY_SCRIPT))
             print("验证成功,继续抓取...")
             return True
         except TimeoutException:
@@ -272,19 +620,18 @@ class CarReviewCrawler:
         print(f"开始抓取: {brand} - {model_name} (ID: {model_id})")
         print(f"{'='*50}")
         
-        driver = webdriver.Chrome()
+        # 复用已启动的浏览器,清除上一个车型留下的 Cookie
+        if self.driver is not None:
+            self.driver.delete_all_cookies()
+        
+        executor = ThreadPoolExecutor(max_workers=self.DETAIL_WORKERS)
         base_url = f'https://k.autohome.com.cn/{model_id}'
-        csv_file = self._get_csv_filename(brand)
         
         model_count = 0
         
         try:
-            # 打开首页
-            driver.get(base_url)
-            time.sleep(3)
-            
             # 验证页面标题
-            if not self.verify_page_title(driver, model_name):
+            if not self.verify_page_title(self.get_page_title(base_url), model_name):
                 print(f"自动跳过该车型")
                 return
             
@@ -294,59 +641,57 @@ class CarReviewCrawler:
                 print(f"进度: {model_name} - 第 {page} 页")
                 
                 try:
-                    driver.get(page_url)
-                    wait = WebDriverWait(driver, 5)
-                    
-                    try:
-                        # 等待列表加载
-                        wait.until(EC.presence_of_element_located((By.CLASS_NAME, 'list_jump__ieH_F')))
-                    except TimeoutException:
-                        print(f"列表加载超时")
-                        
-                        # 首页加载失败可能是验证码
-                        if page == 1:
-                            if not self.handle_captcha(driver):
-                                break
-                        else:
-                            break
+                    html = self.get_listing_html(page_url, first_page=(page == 1))
+                    if html is None:
+                        break
                     
                     # 解析页面
-                    soup = BeautifulSoup(driver.page_source, 'html.parser')
-                    review_elements = soup.find_all('li', class_='clearfix')
+                    review_elements = self.LIST_ITEM_XPATH(lxml.html.fromstring(html))
                     
                     if not review_elements:
                         print("未找到口碑列表,可能已到最后一页")
                         break
                     
-                    page_count = 0
+                    # 先收集本页所有详情链接,再交给线程池并发抓取
+                    detail_tasks = []
+                    skip_count = 0
                     for review_element in review_elements:
                         # 提取口碑详情链接
-                        link_div = review_element.find('li', class_='list_jump__ieH_F')
-                        if not link_div:
+                        hrefs = self.ITEM_LINK_XPATH(review_element)
+                        if not hrefs:
                             continue
                         
-                        review_url = link_div.find('a')['href']
-                        if not review_url.startswith('http'):
+                        # 协议相对链接(//k.autohome.com.cn/...)补全为 https
+                        review_url = hrefs[0]
+                        if review_url[:2] == '//':
                             review_url = 'https:' + review_url
                         
-                        # 提取对比车型
-                        targets = [li.text for li in review_element.find_all('li', class_='list_target__76fWs')]
-                        
-                        # 抓取详情
-                        car_data = self.scrape_review_detail(review_url, targets, model_name)
+                        # 已保存过的口碑直接跳过
+                        if review_url in self.seen_urls:
+                            skip_count += 1
+                            continue
                         
+                        # 提取对比车型
+                        targets = [li.text_content() for li in self.ITEM_TARGETS_XPATH(review_element)]
+                        detail_tasks.append((review_url, targets))
+                    
+                    # 抓取详情(请求速率由令牌桶统一控制),完成一条保存一条
+                    futures = [
+                        executor.submit(self.scrape_review_detail, review_url, targets, model_name)
+                        for review_url, targets in detail_tasks
+                    ]
+                    page_count = 0
+                    for future in as_completed(futures):
+                        car_data = future.result()
                         if car_data:
-                            self.save_to_csv(car_data, csv_file)
+                            self.save_record(car_data, brand)
+                            self.seen_urls.add(car_data['口碑链接'])
                             model_count += 1
                             self.total_count += 1
                             page_count += 1
                             print(f"  ✓ {car_data.get('实际型号')} | {car_data.get('评论发布时间')}")
-                        
-                        # 随机延迟,避免被封
-                        time.sleep(random.uniform(0.5, 1.0))
                     
-                    print(f"--- 本页抓取 {page_count} 条 ---")
-                    time.sleep(random.uniform(1.5, 3.0))
+                    print(f"--- 本页抓取 {page_count} 条, 跳过已抓取 {skip_count} 条 ---")
                 
                 except Exception as e:
                     print(f"页面异常: {e}")
@@ -356,7 +701,7 @@ class CarReviewCrawler:
             print(f"车型抓取异常: {e}")
         
         finally:
-            driver.quit()
+            executor.shutdown(wait=True)
             print(f"{model_name} 完成! 共抓取 {model_count} 条")
             print(f"休息 5 秒...")
             time.sleep(5)
@@ -382,22 +727,32 @@ class CarReviewCrawler:
             selected_brands = self.car_models
         
         # 遍历厂商
-        for brand, models_dict in selected_brands.items():
-            print(f"\n{'='*60}")
-            print(f"开始处理厂商: {brand}")
-            print(f"车型数量: {len(models_dict)}")
-            print(f"输出文件: {self._get_csv_filename(brand)}")
-            print(f"{'='*60}")
-            
-            # 筛选要抓取的车型
-            if models and brand in models:
-                selected_models = {k: v for k, v in models_dict.items() if k in models[brand]}
-            else:
-                selected_models = models_dict
-            
-            # 遍历车型
-            for model_name, model_id in selected_models.items():
-                self.scrape_model(brand, model_name, model_id)
+        try:
+            for brand, models_dict in selected_brands.items():
+                print(f"\n{'='*60}")
+                print(f"开始处理厂商: {brand}")
+                print(f"车型数量: {len(models_dict)}")
+                print(f"输出文件: {self._get_output_filename(brand)}")
+                print(f"{'='*60}")
+                
+                # 筛选要抓取的车型
+                if models and brand in models:
+                    selected_models = {k: v for k, v in models_dict.items() if k in models[brand]}
+                else:
+                    selected_models = models_dict
+                
+                # 遍历车型(同一厂商的所有车型共用一个已打开的写入器)
+                for model_name, model_id in selected_models.items():
+                    self.scrape_model(brand, model_name, model_id)
+                
+                # 厂商抓取完成,落盘并关闭该厂商的输出文件
+                self._close_writer(self._get_csv_filename(brand))
+                self._close_parquet_writer(brand)
+        
+        finally:
+            self._close_writers()
+            self._close_parquet_writers()
+            self._quit_driver()
         
         print(f"\n{'#'*60}")
         print(f"# 所有任务完成!")
@@ -423,7 +778,13 @@ def main():
     #         '比亚迪': ['唐_新能源', '元PLUS']  
     #     }
     # )
-    crawler.run(brands=['奥迪'])
+    
+    # 示例4: 以Parquet格式输出(列式存储,体积更小,下游读取更快)
+    # crawler = CarReviewCrawler(output_format='parquet')
+    try:
+        crawler.run(brands=['奥迪'])
+    finally:
+        crawler.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限速器(参数/图片/口碑爬虫共用)
+
+    并发的线程/协程共享每秒 rate 个请求的额度,最多允许 capacity 个突发请求;
+    也可作为上下文管理器使用: with limiter: ...
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """尝试取一个令牌:成功返回 0,否则返回还需等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """线程中使用:额度不足时阻塞等待到令牌补足(等待期间不持有锁)"""
+        while (wait := self.reserve()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """协程中使用:额度不足时让出事件循环等待"""
+        while (wait := self.reserve()) > 0:
+            await asyncio.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
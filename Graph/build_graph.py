@@ -7,11 +7,21 @@ Date: 2026-02-15
 """
 
 import os
+import csv
 import json
+import math
 import logging
+import subprocess
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pa_csv
 from neo4j import GraphDatabase
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from contextlib import ExitStack
 from dotenv import load_dotenv
 
 # 加载 .env 文件中的环境变量
@@ -23,6 +33,8 @@ NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USERNAME", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+# 每个 UNWIND 批次的评论数：并行写入时批次过大易在公共节点上争锁，默认 2000
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", 2000))
 
 # ==================== Data Paths ====================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -32,6 +44,125 @@ CONFIG_FILE = os.path.join(DATA_DIR, "Processed", "vehicles_config.json")
 UGC_FILE = os.path.join(DATA_DIR, "Processed", "ugc.csv")
 IPA_FILE = os.path.join(DATA_DIR, "Analyzed", "IPA", "step1_scores_matrix.csv")
 PERSONA_FILE = os.path.join(DATA_DIR, "Analyzed", "Persona", "step4_user_persona_full.csv")
+# 评论长文本不写入 Review 节点，按 review_id 另存为 Parquet
+REVIEW_TEXT_FILE = os.path.join(DATA_DIR, "Processed", "review_texts.parquet")
+
+# 离线导入（neo4j-admin database import full）使用的 CSV 目录与命令
+IMPORT_DIR = os.path.join(DATA_DIR, "Graph", "import")
+NEO4J_ADMIN = os.getenv("NEO4J_ADMIN", "neo4j-admin")
+
+# ==================== UGC Columns ====================
+DIMENSIONS = ["appearance", "interior", "space", "intelligence", "driving", "range", "value"]
+DIMENSION_NODES = [
+    {"name": "appearance", "name_cn": "外观"},
+    {"name": "interior", "name_cn": "内饰"},
+    {"name": "space", "name_cn": "空间"},
+    {"name": "intelligence", "name_cn": "智能化"},
+    {"name": "driving", "name_cn": "驾驶"},
+    {"name": "range", "name_cn": "续航"},
+    {"name": "value", "name_cn": "性价比"}
+]
+UGC_STRING_COLUMNS = [
+    'review_id', 'review_date', 'purchase_location', 'season_type', 'model', 'series',
+    *[f'{d}_review' for d in DIMENSIONS], 'most_satisfied', 'least_satisfied'
+]
+UGC_FLOAT_COLUMNS = [
+    'purchase_price', 'mileage', 'real_range', 'energy_consumption',
+    *[f'{d}_score' for d in DIMENSIONS]
+]
+# 评论长文本列：存入 REVIEW_TEXT_FILE，Review 节点只保留评分与元数据
+REVIEW_TEXT_COLUMNS = [*[f'{d}_review' for d in DIMENSIONS], 'most_satisfied', 'least_satisfied']
+REVIEW_TEXT_SCHEMA = pa.schema([(col, pa.string()) for col in ['review_id', *REVIEW_TEXT_COLUMNS]])
+# ugc.csv 列名 -> Review 节点属性名（review_id/model/series 单独传递，文本列不作为节点属性）
+REVIEW_PROPERTY_COLUMNS = {
+    'review_date': 'date',
+    'purchase_location': 'location',
+    'purchase_price': 'price',
+    'mileage': 'mileage',
+    'real_range': 'real_range',
+    'season_type': 'season',
+    'energy_consumption': 'energy_consumption',
+    **{f'{d}_score': f'{d}_score' for d in DIMENSIONS}
+}
+UGC_READ_BLOCK_SIZE = 8 << 20  # PyArrow 流式读取的块大小（8MB）
+MAX_IMPORT_WORKERS = 8  # 评论并行写入的线程数
+# 设置 NEO4J_USE_APOC=1 时用 apoc.periodic.iterate 在服务端并行写入 Review 节点（需安装 APOC）
+USE_APOC = os.getenv("NEO4J_USE_APOC", "0") == "1"
+APOC_BATCH_SIZE = 500
+
+# ==================== Cypher ====================
+# 批量写入语句定义为模块常量，各批次复用同一查询文本
+
+SERIES_UPSERT_CYPHER = """
+    UNWIND $batch AS row
+    MERGE (s:Series {name: row.name})
+    SET s += row
+    WITH s, row
+    MATCH (b:Brand {name: row.brand})
+    MERGE (s)-[:BELONGS_TO_BRAND]->(b)
+"""
+
+MODEL_UPSERT_CYPHER = """
+    UNWIND $batch AS row
+    MERGE (m:Model {name: row.name})
+    SET m += row.props
+    WITH m, row
+    MATCH (s:Series {name: row.series})
+    MERGE (m)-[:BELONGS_TO_SERIES]->(s)
+"""
+
+# Review 节点的 Persona/车型关系子句，接在已绑定 r 与 row 的语句之后
+_REVIEW_LINK_CLAUSES = """
+    WITH r, row
+    FOREACH (_ IN CASE WHEN row.persona IS NOT NULL THEN [1] ELSE [] END |
+        MERGE (p:Persona {name: row.persona})
+        MERGE (r)-[:BELONGS_TO_PERSONA]->(p)
+    )
+    
+    WITH r, row
+    OPTIONAL MATCH (m:Model {name: row.model})
+    FOREACH (_ IN CASE WHEN m IS NOT NULL THEN [1] ELSE [] END |
+        MERGE (r)-[:EVALUATES]->(m)
+    )
+    FOREACH (_ IN CASE WHEN m IS NULL AND row.series IS NOT NULL THEN [1] ELSE [] END |
+        MERGE (s:Series {name: row.series})
+        MERGE (r)-[:EVALUATES]->(s)
+    )
+"""
+
+# Review 节点及其 Persona/车型关系（增强版）
+REVIEW_UPSERT_CYPHER = """
+    UNWIND $batch AS row
+    MERGE (r:Review {id: row.id})
+    SET r += row.props
+""" + _REVIEW_LINK_CLAUSES
+
+# APOC 模式：Review 节点由服务端按 APOC_BATCH_SIZE 分批并行写入（review_id 唯一，节点之间无锁冲突）；
+# 关系会争用公共的 Persona/Model 节点，仍以普通语句串行写入
+REVIEW_NODES_APOC_CYPHER = """
+    CALL apoc.periodic.iterate(
+        "UNWIND $batch AS row RETURN row",
+        "MERGE (r:Review {id: row.id}) SET r += row.props",
+        {batchSize: $batch_size, parallel: true, params: {batch: $batch}}
+    )
+    YIELD failedBatches, errorMessages
+    RETURN failedBatches, errorMessages
+"""
+
+REVIEW_LINKS_CYPHER = """
+    UNWIND $batch AS row
+    MATCH (r:Review {id: row.id})
+""" + _REVIEW_LINK_CLAUSES
+
+# MENTIONS 关系（增强版），在所有 Review 节点写入后单独导入
+# 每条评论在每个维度至多一条关系：只按端点 MERGE（不比较属性），属性再整体 SET，重复导入时更新而非新增
+MENTIONS_UPSERT_CYPHER = """
+    UNWIND $batch AS row
+    MATCH (r:Review {id: row.review_id})
+    MATCH (d:Dimension {name: row.dimension})
+    MERGE (r)-[rel:MENTIONS]->(d)
+    SET rel = row.props
+"""
 
 # ==================== Logging ====================
 logging.basicConfig(
@@ -45,25 +176,95 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# ==================== Offline Import Helpers ====================
+def _is_missing(value):
+    """None 或 NaN 视为缺失值（离线导入时写为空字段，不生成属性）"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _import_type(values):
+    """根据非空取值推断 neo4j-admin import 表头中的属性类型后缀"""
+    kinds = {type(v) for v in values if not _is_missing(v)}
+    if kinds and kinds <= {bool}:
+        return ':boolean'
+    if kinds and kinds <= {int}:
+        return ':long'
+    if kinds and kinds <= {int, float}:
+        return ':double'
+    return ''
+
+
+def _import_value(value):
+    """转换为 neo4j-admin import CSV 字段值"""
+    if _is_missing(value):
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def _write_import_csv(path, header, rows):
+    """写入一个 neo4j-admin import 格式的 CSV 文件，返回文件路径"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def _write_node_csv(path, id_space, rows, id_key='name'):
+    """将 dict 记录写为节点 CSV：id_key 列作为 ID，其余键按取值推断类型"""
+    keys = list(dict.fromkeys(k for row in rows for k in row if k != id_key))
+    header = [f'{id_key}:ID({id_space})'] + [f'{k}{_import_type([row.get(k) for row in rows])}' for k in keys]
+    return _write_import_csv(
+        path, header, ([row[id_key]] + [_import_value(row.get(k)) for k in keys] for row in rows)
+    )
+
+
 class Neo4jGraphBuilder:
     """Neo4j 知识图谱构建器"""
     
     def __init__(self, uri, user, password, database="neo4j"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password), database=database)
+        # 连接池按并行写入线程数配置，连接保持存活并定期轮换
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            database=database,
+            max_connection_pool_size=MAX_IMPORT_WORKERS * 2,
+            connection_acquisition_timeout=60,
+            max_connection_lifetime=3600,
+            keep_alive=True
+        )
+        self.database = database
+        self._session = None
         logger.info("Connected to Neo4j Aura")
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self):
+        """长期复用的会话（首次使用时创建），避免每条查询重新获取连接"""
+        if self._session is None:
+            self._session = self.driver.session(database=self.database)
+        return self._session
+
     def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
         self.driver.close()
         logger.info("Connection closed")
 
     def run_query(self, query, parameters=None):
-        """执行 Cypher 查询"""
-        with self.driver.session() as session:
-            result = session.run(query, parameters or {})
-            return result
+        """在复用的会话上以托管写事务执行 Cypher 查询（瞬时错误由驱动自动重试），返回执行摘要"""
+        return self.session.execute_write(lambda tx: tx.run(query, parameters or {}).consume())
 
     def create_constraints(self):
-        """创建唯一性约束"""
+        """创建唯一性约束及属性索引"""
         logger.info("Creating constraints...")
         constraints = [
             "CREATE CONSTRAINT IF NOT EXISTS FOR (b:Brand) REQUIRE b.name IS UNIQUE",
@@ -76,29 +277,35 @@ class Neo4jGraphBuilder:
         for constraint_query in constraints:
             self.run_query(constraint_query)
         logger.info("Constraints created successfully")
+        
+        # 唯一性约束已自带 name/id 索引；另为检索常用的车型参数过滤条件建立范围索引
+        logger.info("Creating indexes...")
+        indexes = [
+            "CREATE INDEX model_price IF NOT EXISTS FOR (m:Model) ON (m.price)",
+            "CREATE INDEX model_range_cltc IF NOT EXISTS FOR (m:Model) ON (m.range_cltc)"
+        ]
+        for index_query in indexes:
+            self.run_query(index_query)
+        logger.info("Indexes created successfully")
 
     def import_dimensions(self):
         """导入评价维度节点"""
         logger.info("Importing Dimensions...")
-        dimensions = [
-            {"name": "appearance", "name_cn": "外观"},
-            {"name": "interior", "name_cn": "内饰"},
-            {"name": "space", "name_cn": "空间"},
-            {"name": "intelligence", "name_cn": "智能化"},
-            {"name": "driving", "name_cn": "驾驶"},
-            {"name": "range", "name_cn": "续航"},
-            {"name": "value", "name_cn": "性价比"}
-        ]
         query = """
         UNWIND $batch AS row
         MERGE (d:Dimension {name: row.name})
         SET d.name_cn = row.name_cn
         """
-        self.run_query(query, {"batch": dimensions})
-        logger.info(f"Imported {len(dimensions)} dimensions")
+        self.run_query(query, {"batch": DIMENSION_NODES})
+        logger.info(f"Imported {len(DIMENSION_NODES)} dimensions")
 
-    def import_vehicles(self):
-        """导入车型层级数据 (Brand -> Series -> Model)"""
+    def load_vehicles(self):
+        """
+        读取车型配置并合并 IPA 分数
+        
+        Returns:
+            (品牌名集合, {车系名: Series 属性}, Model 记录列表)
+        """
         logger.info("Loading vehicle configuration...")
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
             vehicles = json.load(f)
@@ -110,7 +317,7 @@ class Neo4jGraphBuilder:
         # 加载 IPA 数据
         logger.info("Loading IPA scores...")
         ipa_df = pd.read_csv(IPA_FILE)
-        ipa_lookup = ipa_df.set_index('series').to_dict('index')
+        ipa_lookup = {record.pop('series'): record for record in ipa_df.to_dict('records')}
 
         # 处理车型数据
         for v in vehicles:
@@ -126,25 +333,31 @@ class Neo4jGraphBuilder:
                 if v['series'] in ipa_lookup:
                     series_data[v['series']].update(ipa_lookup[v['series']])
 
-            # Model 数据 - 扁平化属性
-            model = {
+            # Model 数据 - 扁平化属性（name/series 用于匹配，其余作为节点属性 map）
+            models.append({
                 "name": v['model'],
                 "series": v['series'],
-                "price": v.get('price'),
-                "seats": v.get('seats'),
-                "length_width_height": f"{v.get('dimensions', {}).get('length', 0)}×{v.get('dimensions', {}).get('width', 0)}×{v.get('dimensions', {}).get('height', 0)}",
-                "wheelbase": v.get('dimensions', {}).get('wheelbase'),
-                "acceleration_0_100": v.get('performance', {}).get('acceleration_0_100'),
-                "battery_capacity": v.get('battery', {}).get('capacity'),
-                "battery_type": v.get('battery', {}).get('type'),
-                "range_cltc": v.get('battery', {}).get('cltc_range'),
-                "suspension_front": v.get('chassis', {}).get('front_suspension'),
-                "suspension_rear": v.get('chassis', {}).get('rear_suspension'),
-                "cockpit_system": v.get('intelligence', {}).get('cockpit_system'),
-                "adas_system": v.get('intelligence', {}).get('adas_system'),
-                "lidar_count": v.get('intelligence', {}).get('lidar_count', 0)
-            }
-            models.append(model)
+                "props": {
+                    "price": v.get('price'),
+                    "seats": v.get('seats'),
+                    "length_width_height": f"{v.get('dimensions', {}).get('length', 0)}×{v.get('dimensions', {}).get('width', 0)}×{v.get('dimensions', {}).get('height', 0)}",
+                    "wheelbase": v.get('dimensions', {}).get('wheelbase'),
+                    "acceleration_0_100": v.get('performance', {}).get('acceleration_0_100'),
+                    "battery_capacity": v.get('battery', {}).get('capacity'),
+                    "battery_type": v.get('battery', {}).get('type'),
+                    "range_cltc": v.get('battery', {}).get('cltc_range'),
+                    "suspension_front": v.get('chassis', {}).get('front_suspension'),
+                    "suspension_rear": v.get('chassis', {}).get('rear_suspension'),
+                    "cockpit_system": v.get('intelligence', {}).get('cockpit_system'),
+                    "adas_system": v.get('intelligence', {}).get('adas_system'),
+                    "lidar_count": v.get('intelligence', {}).get('lidar_count', 0)
+                }
+            })
+        return brands, series_data, models
+
+    def import_vehicles(self):
+        """导入车型层级数据 (Brand -> Series -> Model)"""
+        brands, series_data, models = self.load_vehicles()
 
         # 导入 Brands
         logger.info(f"Importing {len(brands)} brands...")
@@ -155,63 +368,33 @@ class Neo4jGraphBuilder:
 
         # 导入 Series
         logger.info(f"Importing {len(series_data)} series...")
-        series_query = """
-        UNWIND $batch AS row
-        MERGE (s:Series {name: row.name})
-        SET s += row
-        WITH s, row
-        MATCH (b:Brand {name: row.brand})
-        MERGE (s)-[:BELONGS_TO_BRAND]->(b)
-        """
-        self.run_query(series_query, {"batch": list(series_data.values())})
+        self.run_query(SERIES_UPSERT_CYPHER, {"batch": list(series_data.values())})
 
         # 导入 Models
         logger.info(f"Importing {len(models)} models...")
-        model_query = """
-        UNWIND $batch AS row
-        MERGE (m:Model {name: row.name})
-        SET m.price = row.price,
-            m.seats = row.seats,
-            m.length_width_height = row.length_width_height,
-            m.wheelbase = row.wheelbase,
-            m.acceleration_0_100 = row.acceleration_0_100,
-            m.battery_capacity = row.battery_capacity,
-            m.battery_type = row.battery_type,
-            m.range_cltc = row.range_cltc,
-            m.suspension_front = row.suspension_front,
-            m.suspension_rear = row.suspension_rear,
-            m.cockpit_system = row.cockpit_system,
-            m.adas_system = row.adas_system,
-            m.lidar_count = row.lidar_count
-        WITH m, row
-        MATCH (s:Series {name: row.series})
-        MERGE (m)-[:BELONGS_TO_SERIES]->(s)
-        """
-        self.run_query(model_query, {"batch": models})
+        self.run_query(MODEL_UPSERT_CYPHER, {"batch": models})
 
         # 创建 Series 分析关系
         self._create_series_analytical_relationships(series_data)
 
+    def _series_analytical_rels(self, series_data):
+        """按 P_ 分数划分 Series 的优势 (>0.8) 与劣势 (<0.6) 维度，返回 (优势关系, 劣势关系)"""
+        # 各车系的 P_ 分数整理为 车系 × 维度 的数值表（非数值转为 NaN），再展开为长表
+        scores = pd.DataFrame.from_dict(series_data, orient='index').reindex(columns=[f'P_{d}' for d in DIMENSIONS])
+        scores = scores.apply(pd.to_numeric, errors='coerce')
+        scores.columns = DIMENSIONS
+        long_scores = scores.rename_axis('series').reset_index().melt(
+            id_vars='series', var_name='dimension', value_name='score'
+        ).dropna(subset=['score'])
+        
+        strength_rels = long_scores[long_scores['score'] > 0.8].to_dict('records')
+        weakness_rels = long_scores[long_scores['score'] < 0.6].to_dict('records')
+        return strength_rels, weakness_rels
+
     def _create_series_analytical_relationships(self, series_data):
         """创建 Series 的优劣势关系"""
         logger.info("Creating analytical relationships for Series...")
-        dims = ["appearance", "interior", "space", "intelligence", "driving", "range", "value"]
-        
-        strength_rels = []
-        weakness_rels = []
-        
-        for s_name, data in series_data.items():
-            for d in dims:
-                p_score = data.get(f'P_{d}')
-                if p_score is not None:
-                    try:
-                        p_val = float(p_score)
-                        if p_val > 0.8:
-                            strength_rels.append({"series": s_name, "dimension": d, "score": p_val})
-                        elif p_val < 0.6:
-                            weakness_rels.append({"series": s_name, "dimension": d, "score": p_val})
-                    except (ValueError, TypeError):
-                        continue
+        strength_rels, weakness_rels = self._series_analytical_rels(series_data)
 
         if strength_rels:
             self.run_query("""
@@ -231,11 +414,19 @@ class Neo4jGraphBuilder:
             """, {"batch": weakness_rels})
             logger.info(f"Created {len(weakness_rels)} HAS_WEAKNESS relationships")
 
-    def import_personas(self):
-        """导入用户画像节点（增强版）"""
-        logger.info("Processing personas...")
-        df = pd.read_csv(PERSONA_FILE)
-        
+    def load_personas(self):
+        """读取用户画像表（只读取画像名、统计字段和 w_ 权重列），供画像与评论导入共用"""
+        logger.info("Loading persona data...")
+        persona_cols = {'persona_name', 'review_id', 'purchase_price', 'mileage'}
+        return pd.read_csv(
+            PERSONA_FILE,
+            usecols=lambda c: c in persona_cols or c.startswith('w_'),
+            dtype={'review_id': str, 'persona_name': str},
+            engine='c'
+        )
+
+    def _prepare_personas(self, df):
+        """由用户画像表计算画像质心与统计元数据，返回 (Persona 记录, PRIORITIZES 关系)"""
         # 计算画像质心
         weight_cols = [c for c in df.columns if c.startswith('w_')]
         centroids = df.groupby('persona_name')[weight_cols].mean().reset_index()
@@ -254,7 +445,14 @@ class Neo4jGraphBuilder:
         personas = []
         priorities = []
         
-        for _, row in centroids.iterrows():
+        # 整表一次性转为 dict 列表，避免 iterrows 逐行构造 Series
+        records = centroids.to_dict('records')
+        
+        # PRIORITIZES 关系 (Top 3)：按权重降序取前三列（稳定排序，同分保持列顺序）
+        weight_dims = [c.replace('w_', '') for c in weight_cols]
+        top3_idx = np.argsort(-centroids[weight_cols].to_numpy(dtype=float), axis=1, kind='stable')[:, :3]
+        
+        for row, idx in zip(records, top3_idx):
             persona_name = row['persona_name']
             personas.append({
                 'name': persona_name,
@@ -270,16 +468,24 @@ class Neo4jGraphBuilder:
                 'avg_mileage': float(row['avg_mileage']) if pd.notna(row['avg_mileage']) else None
             })
             
-            # PRIORITIZES 关系 (Top 3)
-            weights = [(k.replace('w_', ''), v) for k, v in row.items() if k.startswith('w_')]
-            top3 = sorted(weights, key=lambda x: x[1], reverse=True)[:3]
-            
-            for dim_name, weight_val in top3:
+            for k in idx:
                 priorities.append({
                     "persona": persona_name,
-                    "dimension": dim_name,
-                    "weight": float(weight_val)
+                    "dimension": weight_dims[k],
+                    "weight": float(row[weight_cols[k]])
                 })
+        return personas, priorities
+
+    def import_personas(self, persona_df=None):
+        """
+        导入用户画像节点（增强版）
+        
+        Args:
+            persona_df: 已读取的用户画像表，None 时自行读取
+        """
+        logger.info("Processing personas...")
+        df = persona_df if persona_df is not None else self.load_personas()
+        personas, priorities = self._prepare_personas(df)
 
         # 导入 Persona 节点（增强版）
         logger.info(f"Importing {len(personas)} personas...")
@@ -309,17 +515,21 @@ class Neo4jGraphBuilder:
         """
         self.run_query(rel_query, {"batch": priorities})
 
-    def import_reviews(self, limit=None, random_sample=False):
+    def import_reviews(self, limit=None, random_sample=False, persona_df=None):
         """
         导入用户评论及其关系
         
         Args:
             limit: 限制导入的评论数量（用于测试），None 表示导入全部
             random_sample: 是否随机抽样（True=随机，False=顺序读取）
+            persona_df: 已读取的用户画像表，None 时只读取 review_id 和 persona_name 两列
         """
         logger.info("Loading persona mapping...")
-        p_df = pd.read_csv(PERSONA_FILE, usecols=['review_id', 'persona_name'])
-        persona_map = p_df.set_index('review_id')['persona_name'].to_dict()
+        if persona_df is not None:
+            p_df = persona_df
+        else:
+            p_df = pd.read_csv(PERSONA_FILE, usecols=['review_id', 'persona_name'], dtype={'review_id': str})
+        persona_map = dict(zip(p_df['review_id'].tolist(), p_df['persona_name'].tolist()))
         
         if limit:
             if random_sample:
@@ -329,14 +539,14 @@ class Neo4jGraphBuilder:
         else:
             logger.info("Importing all reviews in batches...")
         
-        chunk_size = 5000
-        dims = ["appearance", "interior", "space", "intelligence", "driving", "range", "value"]
+        chunk_size = INGEST_BATCH
         
         # 如果是随机抽样模式，先读取所有 review_id 并随机选择
         selected_ids = None
         if limit and random_sample:
             logger.info("Reading all review IDs for random sampling...")
-            all_ids = pd.read_csv(UGC_FILE, usecols=['review_id'])['review_id'].tolist()
+            id_options = pa_csv.ConvertOptions(include_columns=['review_id'], column_types={'review_id': pa.string()})
+            all_ids = pa_csv.read_csv(UGC_FILE, convert_options=id_options).column('review_id').to_pylist()
             total_available = len(all_ids)
             
             if limit > total_available:
@@ -349,158 +559,341 @@ class Neo4jGraphBuilder:
         
         total_reviews = 0
         total_mentions = 0
+        pieces = []
+        piece_rows = 0
+        selected_array = pa.array(list(selected_ids), type=pa.string()) if selected_ids is not None else None
         
-        for chunk in pd.read_csv(UGC_FILE, chunksize=chunk_size):
-            reviews_batch = []
-            mentions_batch = []
-            
-            for _, row in chunk.iterrows():
-                rid = str(row['review_id'])
-                
-                # 随机抽样模式：跳过不在选中集合的评论
-                if selected_ids is not None and rid not in selected_ids:
-                    continue
+        # 两阶段导入：先并行写入全部 Review 节点，再写入 MENTIONS 关系；每个批次使用独立会话
+        done_reviews = 0
+        pending = set()
+        mention_batches = []
+        with ThreadPoolExecutor(max_workers=MAX_IMPORT_WORKERS) as executor, self._open_text_writer() as text_writer:
+            # PyArrow 流式读取 CSV，按列整体转换，不再逐行处理
+            for batch in self._iter_ugc_batches():
+                # 随机抽样模式：只保留选中集合中的评论
+                if selected_array is not None:
+                    batch = batch.filter(pc.is_in(batch.column('review_id'), value_set=selected_array))
                 
-                # Review 节点数据（完整增强版）
-                review_data = {
-                    "id": rid,
-                    "date": str(row['review_date']) if pd.notna(row['review_date']) else None,
-                    "location": str(row['purchase_location']) if pd.notna(row['purchase_location']) else None,
-                    "price": float(row['purchase_price']) if pd.notna(row['purchase_price']) else None,
-                    "mileage": float(row['mileage']) if pd.notna(row['mileage']) else None,
-                    "real_range": float(row['real_range']) if pd.notna(row['real_range']) else None,
-                    "season": str(row['season_type']) if pd.notna(row['season_type']) else None,
-                    "energy_consumption": float(row['energy_consumption']) if pd.notna(row['energy_consumption']) else None,
-                    "model": str(row['model']) if pd.notna(row['model']) else None,
-                    "series": str(row['series']) if pd.notna(row['series']) else None,
-                    "persona": persona_map.get(rid),
-                    # 评论文本内容
-                    "appearance_review": str(row['appearance_review']) if pd.notna(row['appearance_review']) else None,
-                    "interior_review": str(row['interior_review']) if pd.notna(row['interior_review']) else None,
-                    "space_review": str(row['space_review']) if pd.notna(row['space_review']) else None,
-                    "intelligence_review": str(row['intelligence_review']) if pd.notna(row['intelligence_review']) else None,
-                    "driving_review": str(row['driving_review']) if pd.notna(row['driving_review']) else None,
-                    "range_review": str(row['range_review']) if pd.notna(row['range_review']) else None,
-                    "value_review": str(row['value_review']) if pd.notna(row['value_review']) else None,
-                    "most_satisfied": str(row['most_satisfied']) if pd.notna(row['most_satisfied']) else None,
-                    "least_satisfied": str(row['least_satisfied']) if pd.notna(row['least_satisfied']) else None,
-                    # 评分数据
-                    "appearance_score": float(row['appearance_score']) if pd.notna(row['appearance_score']) else None,
-                    "interior_score": float(row['interior_score']) if pd.notna(row['interior_score']) else None,
-                    "space_score": float(row['space_score']) if pd.notna(row['space_score']) else None,
-                    "intelligence_score": float(row['intelligence_score']) if pd.notna(row['intelligence_score']) else None,
-                    "driving_score": float(row['driving_score']) if pd.notna(row['driving_score']) else None,
-                    "range_score": float(row['range_score']) if pd.notna(row['range_score']) else None,
-                    "value_score": float(row['value_score']) if pd.notna(row['value_score']) else None
-                }
-                reviews_batch.append(review_data)
-                
-                # MENTIONS 关系（增强版：添加评分和文本元数据）
-                for d in dims:
-                    content_col = f'{d}_review'
-                    score_col = f'{d}_score'
+                # 按 chunk_size 切片，凑满一批后连同 Arrow 数据一起提交，记录组装在工作线程中完成
+                offset = 0
+                while offset < batch.num_rows:
+                    piece = batch.slice(offset, chunk_size - piece_rows)
+                    offset += piece.num_rows
+                    pieces.append(piece)
+                    piece_rows += piece.num_rows
+                    text_writer.write_batch(piece.select(REVIEW_TEXT_SCHEMA.names))
+                    if piece_rows < chunk_size:
+                        continue
                     
-                    content = row.get(content_col)
-                    has_content = pd.notna(content) and str(content).strip() != ""
-                    review_length = len(str(content)) if has_content else 0
+                    pending.add(executor.submit(self._import_review_pieces, pieces, persona_map))
+                    total_reviews += piece_rows
+                    pieces = []
+                    piece_rows = 0
                     
-                    sentiment = 0.0
-                    is_strong = False
-                    score_val = None
+                    # 限制在途批次数，避免读取速度远超写入时积压内存
+                    if len(pending) >= MAX_IMPORT_WORKERS * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        done_reviews = self._collect_review_batches(done, done_reviews, mention_batches)
                     
-                    if pd.notna(row.get(score_col)):
-                        try:
-                            score_val = float(row[score_col])
-                            # 评分显著性检查 (1-2 或 4-5)
-                            if score_val >= 4 or score_val <= 2:
-                                sentiment = (score_val - 3) / 2  # 标准化到 [-1, 1]
-                                is_strong = (score_val >= 5 or score_val <= 1)
-                                
-                                if has_content or True:  # 有评分就创建关系
-                                    mentions_batch.append({
-                                        "review_id": rid,
-                                        "dimension": d,
-                                        "sentiment": sentiment,
-                                        "is_strong": is_strong,
-                                        "score": score_val,
-                                        "has_text": has_content,
-                                        "review_length": review_length
-                                    })
-                        except (ValueError, TypeError):
-                            pass
-
-            # 导入 Review 节点及关系（增强版）
-            query = """
-            UNWIND $batch AS row
-            MERGE (r:Review {id: row.id})
-            SET r.date = row.date,
-                r.location = row.location,
-                r.price = row.price,
-                r.mileage = row.mileage,
-                r.real_range = row.real_range,
-                r.season = row.season,
-                r.energy_consumption = row.energy_consumption,
-                r.appearance_review = row.appearance_review,
-                r.interior_review = row.interior_review,
-                r.space_review = row.space_review,
-                r.intelligence_review = row.intelligence_review,
-                r.driving_review = row.driving_review,
-                r.range_review = row.range_review,
-                r.value_review = row.value_review,
-                r.most_satisfied = row.most_satisfied,
-                r.least_satisfied = row.least_satisfied,
-                r.appearance_score = row.appearance_score,
-                r.interior_score = row.interior_score,
-                r.space_score = row.space_score,
-                r.intelligence_score = row.intelligence_score,
-                r.driving_score = row.driving_score,
-                r.range_score = row.range_score,
-                r.value_score = row.value_score
+                    # 测试模式：达到限制后停止
+                    if limit and total_reviews >= limit:
+                        break
+                
+                if limit and total_reviews >= limit:
+                    logger.info(f"Reached limit of {limit} reviews. Stopping import.")
+                    break
             
-            WITH r, row
-            FOREACH (_ IN CASE WHEN row.persona IS NOT NULL THEN [1] ELSE [] END |
-                MERGE (p:Persona {name: row.persona})
-                MERGE (r)-[:BELONGS_TO_PERSONA]->(p)
-            )
+            # 写入最后一批不足 chunk_size 的评论
+            if pieces:
+                pending.add(executor.submit(self._import_review_pieces, pieces, persona_map))
+                total_reviews += piece_rows
             
-            WITH r, row
-            OPTIONAL MATCH (m:Model {name: row.model})
-            FOREACH (_ IN CASE WHEN m IS NOT NULL THEN [1] ELSE [] END |
-                MERGE (r)-[:EVALUATES]->(m)
+            done_reviews = self._collect_review_batches(pending, done_reviews, mention_batches)
+            
+            # 第二阶段：节点已全部存在，关系批次之间不再有节点写入冲突
+            logger.info("Importing MENTIONS relationships...")
+            pending = [
+                executor.submit(self._write_batch, MENTIONS_UPSERT_CYPHER, batch)
+                for batch in mention_batches if batch
+            ]
+            total_mentions = self._collect_batches(pending, 0, "mentions")
+
+        logger.info(f"Import complete! Total: {total_reviews} reviews, {total_mentions} dimension mentions")
+
+    def _iter_ugc_batches(self):
+        """
+        以 PyArrow 流式读取 UGC CSV，逐块产出 RecordBatch
+        
+        列类型固定（文本列为 string，数值列为 float64），避免按块推断类型不一致；空值为 null
+        """
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=UGC_STRING_COLUMNS + UGC_FLOAT_COLUMNS,
+            column_types={
+                **{col: pa.string() for col in UGC_STRING_COLUMNS},
+                **{col: pa.float64() for col in UGC_FLOAT_COLUMNS}
+            },
+            strings_can_be_null=True
+        )
+        read_options = pa_csv.ReadOptions(block_size=UGC_READ_BLOCK_SIZE)
+        with pa_csv.open_csv(UGC_FILE, read_options=read_options, convert_options=convert_options) as reader:
+            yield from reader
+
+    def _open_text_writer(self):
+        """打开评论文本 Parquet 写入器（review_id + 文本列，覆盖旧文件）"""
+        os.makedirs(os.path.dirname(REVIEW_TEXT_FILE), exist_ok=True)
+        return pq.ParquetWriter(REVIEW_TEXT_FILE, REVIEW_TEXT_SCHEMA)
+
+    def _build_review_records(self, batch, persona_map):
+        """Review 节点数据（完整增强版）：属性列的选择与重命名在 Arrow 中完成，一次性转换为属性 map 列表"""
+        props = batch.select(list(REVIEW_PROPERTY_COLUMNS)).rename_columns(
+            list(REVIEW_PROPERTY_COLUMNS.values())
+        ).to_pylist()
+        return [
+            {"id": rid, "model": model, "series": series, "persona": persona_map.get(rid), "props": row_props}
+            for rid, model, series, row_props in zip(
+                batch.column('review_id').to_pylist(),
+                batch.column('model').to_pylist(),
+                batch.column('series').to_pylist(),
+                props
+            )
+        ]
+
+    def _build_mention_records(self, batch):
+        """
+        MENTIONS 关系数据（增强版：添加评分和文本元数据），按维度整列计算
+        
+        只保留显著评分 (1-2 或 4-5)，空评分在过滤时自动丢弃
+        """
+        review_ids = batch.column('review_id')
+        records = []
+        for d in DIMENSIONS:
+            scores = batch.column(f'{d}_score')
+            mask = pc.or_(pc.less_equal(scores, 2), pc.greater_equal(scores, 4))
+            scores = pc.filter(scores, mask)
+            contents = pc.filter(batch.column(f'{d}_review'), mask)
+            has_text = pc.fill_null(pc.greater(pc.utf8_length(pc.utf8_trim_whitespace(contents)), 0), False)
+            props = pa.table({
+                "sentiment": pc.divide(pc.subtract(scores, 3), 2),  # 标准化到 [-1, 1]
+                "is_strong_signal": pc.or_(pc.greater_equal(scores, 5), pc.less_equal(scores, 1)),
+                "score": scores,
+                "has_text": has_text,
+                "review_length": pc.if_else(has_text, pc.utf8_length(contents), pa.scalar(0, pa.int32()))
+            }).to_pylist()
+            records.extend(
+                {"review_id": rid, "dimension": d, "props": row_props}
+                for rid, row_props in zip(pc.filter(review_ids, mask).to_pylist(), props)
             )
-            FOREACH (_ IN CASE WHEN m IS NULL AND row.series IS NOT NULL THEN [1] ELSE [] END |
-                MERGE (s:Series {name: row.series})
-                MERGE (r)-[:EVALUATES]->(s)
+        return records
+
+    def _import_review_pieces(self, pieces, persona_map):
+        """
+        由 Arrow 切片组装一批 Review 与 MENTIONS 记录并写入 Review 节点（供线程池调用）
+        
+        Returns:
+            (评论数, 该批的 MENTIONS 记录列表)，关系留待第二阶段写入
+        """
+        reviews_batch = []
+        mentions_batch = []
+        for piece in pieces:
+            reviews_batch.extend(self._build_review_records(piece, persona_map))
+            mentions_batch.extend(self._build_mention_records(piece))
+        if USE_APOC:
+            self._write_apoc_batch(REVIEW_NODES_APOC_CYPHER, reviews_batch)
+            self._write_batch(REVIEW_LINKS_CYPHER, reviews_batch)
+        else:
+            self._write_batch(REVIEW_UPSERT_CYPHER, reviews_batch)
+        return len(reviews_batch), mentions_batch
+
+    def _collect_review_batches(self, futures, done_reviews, mention_batches):
+        """汇总已完成的 Review 批次，MENTIONS 记录追加到 mention_batches，返回累计评论数"""
+        for future in as_completed(futures):
+            reviews, mentions = future.result()
+            done_reviews += reviews
+            mention_batches.append(mentions)
+            logger.info(f"Processed {done_reviews} reviews...")
+        return done_reviews
+
+    def _write_batch(self, query, batch):
+        """
+        在独立会话中以 $batch 参数执行一条批量写入语句（供线程池调用），返回批次行数
+        
+        使用托管事务 execute_write，并行批次争用 Dimension 等公共节点产生死锁（TransientError）时由驱动自动退避重试
+        """
+        with self.driver.session(database=self.database) as session:
+            session.execute_write(lambda tx: tx.run(query, {"batch": batch}).consume())
+        return len(batch)
+
+    def _write_apoc_batch(self, query, batch):
+        """执行 apoc.periodic.iterate 批量写入语句，服务端有失败批次时抛出异常，返回批次行数"""
+        with self.driver.session(database=self.database) as session:
+            record = session.execute_write(
+                lambda tx: tx.run(query, {"batch": batch, "batch_size": APOC_BATCH_SIZE}).single()
             )
-            """
-            self.run_query(query, {"batch": reviews_batch})
-            
-            # 导入 MENTIONS 关系（增强版）
-            if mentions_batch:
-                m_query = """
-                UNWIND $batch AS row
-                MATCH (r:Review {id: row.review_id})
-                MATCH (d:Dimension {name: row.dimension})
-                MERGE (r)-[:MENTIONS {
-                    sentiment: row.sentiment, 
-                    is_strong_signal: row.is_strong,
-                    score: row.score,
-                    has_text: row.has_text,
-                    review_length: row.review_length
-                }]->(d)
-                """
-                self.run_query(m_query, {"batch": mentions_batch})
-                total_mentions += len(mentions_batch)
-            
-            total_reviews += len(reviews_batch)
-            logger.info(f"Processed {total_reviews} reviews, {total_mentions} mentions...")
+        if record['failedBatches']:
+            raise RuntimeError(f"apoc.periodic.iterate failed {record['failedBatches']} batches: {record['errorMessages']}")
+        return len(batch)
+
+    def _collect_batches(self, futures, done, label):
+        """汇总已完成批次的写入行数并输出进度，返回更新后的累计行数"""
+        for future in as_completed(futures):
+            done += future.result()
+            logger.info(f"Processed {done} {label}...")
+        return done
+
+    def export_import_csvs(self, import_dir=IMPORT_DIR):
+        """
+        导出 neo4j-admin database import 格式的节点与关系 CSV（全量，不支持测试模式）
+        
+        图谱内容与在线导入一致：评论引用但车型数据中不存在的车系、画像表中不存在的画像会补为仅含名称的节点
+        
+        Args:
+            import_dir: CSV 输出目录
+        
+        Returns:
+            (节点文件列表 [(标签, 路径)], 关系文件列表 [(关系类型, 路径)])
+        """
+        os.makedirs(import_dir, exist_ok=True)
+        def path(name):
+            return os.path.join(import_dir, name)
+        
+        brands, series_data, models = self.load_vehicles()
+        # 同名车型以最后一条为准（与在线导入 MERGE + SET 的结果一致）
+        model_props = {m['name']: m['props'] for m in models}
+        model_series = list(dict.fromkeys((m['name'], m['series']) for m in models))
+        
+        persona_df = self.load_personas()
+        personas, priorities = self._prepare_personas(persona_df)
+        persona_map = dict(zip(persona_df['review_id'].tolist(), persona_df['persona_name'].tolist()))
+        
+        # 流式导出 Review 节点及其关系，同时收集需要补建的车系/画像
+        logger.info("Exporting reviews for offline import...")
+        extra_series = set()
+        extra_personas = set()
+        review_ids = set()
+        total_reviews = 0
+        review_header = ['id:ID(Review)'] + [
+            f"{name}{':double' if col in UGC_FLOAT_COLUMNS else ''}" for col, name in REVIEW_PROPERTY_COLUMNS.items()
+        ]
+        review_files = {
+            'reviews': (path('reviews.csv'), review_header),
+            'personas': (path('review_persona.csv'), [':START_ID(Review)', ':END_ID(Persona)']),
+            'models': (path('review_model.csv'), [':START_ID(Review)', ':END_ID(Model)']),
+            'series': (path('review_series.csv'), [':START_ID(Review)', ':END_ID(Series)']),
+            'mentions': (path('mentions.csv'), [
+                ':START_ID(Review)', ':END_ID(Dimension)', 'sentiment:double', 'is_strong_signal:boolean',
+                'score:double', 'has_text:boolean', 'review_length:long'
+            ])
+        }
+        with ExitStack() as stack:
+            text_writer = stack.enter_context(self._open_text_writer())
+            writers = {}
+            for key, (file_path, header) in review_files.items():
+                writers[key] = csv.writer(stack.enter_context(open(file_path, 'w', newline='', encoding='utf-8')))
+                writers[key].writerow(header)
             
-            # 测试模式：达到限制后停止
-            if limit and total_reviews >= limit:
-                logger.info(f"Reached limit of {limit} reviews. Stopping import.")
-                break
+            for batch in self._iter_ugc_batches():
+                text_writer.write_batch(batch.select(REVIEW_TEXT_SCHEMA.names))
+                # 重复的 review_id 只保留首条，其关系一并跳过
+                new_ids = set()
+                for review in self._build_review_records(batch, persona_map):
+                    rid = review['id']
+                    if rid in review_ids:
+                        continue
+                    review_ids.add(rid)
+                    new_ids.add(rid)
+                    writers['reviews'].writerow([rid] + [_import_value(v) for v in review['props'].values()])
+                    if review['persona'] is not None:
+                        writers['personas'].writerow([rid, review['persona']])
+                        extra_personas.add(review['persona'])
+                    if review['model'] in model_props:
+                        writers['models'].writerow([rid, review['model']])
+                    elif review['series'] is not None:
+                        writers['series'].writerow([rid, review['series']])
+                        extra_series.add(review['series'])
+                for mention in self._build_mention_records(batch):
+                    if mention['review_id'] in new_ids:
+                        writers['mentions'].writerow(
+                            [mention['review_id'], mention['dimension']]
+                            + [_import_value(v) for v in mention['props'].values()]
+                        )
+                total_reviews = len(review_ids)
+                logger.info(f"Exported {total_reviews} reviews...")
+        
+        # 节点文件
+        logger.info("Exporting nodes for offline import...")
+        persona_names = {p['name'] for p in personas}
+        nodes = [
+            ('Dimension', _write_node_csv(path('dimensions.csv'), 'Dimension', DIMENSION_NODES)),
+            ('Brand', _write_node_csv(path('brands.csv'), 'Brand', [{'name': b} for b in sorted(brands)])),
+            ('Series', _write_node_csv(path('series.csv'), 'Series', list(series_data.values()) + [
+                {'name': name} for name in sorted(extra_series - series_data.keys())
+            ])),
+            ('Model', _write_node_csv(path('models.csv'), 'Model', [
+                {'name': name, **props} for name, props in model_props.items()
+            ])),
+            ('Persona', _write_node_csv(path('personas.csv'), 'Persona', personas + [
+                {'name': name} for name in sorted(extra_personas - persona_names)
+            ])),
+            ('Review', review_files['reviews'][0])
+        ]
+        
+        # 关系文件
+        strength_rels, weakness_rels = self._series_analytical_rels(series_data)
+        score_header = [':START_ID(Series)', ':END_ID(Dimension)', 'score:double']
+        rels = [
+            ('BELONGS_TO_BRAND', _write_import_csv(
+                path('series_brand.csv'), [':START_ID(Series)', ':END_ID(Brand)'],
+                ([s['name'], s['brand']] for s in series_data.values())
+            )),
+            ('BELONGS_TO_SERIES', _write_import_csv(
+                path('model_series.csv'), [':START_ID(Model)', ':END_ID(Series)'], model_series
+            )),
+            ('HAS_STRENGTH', _write_import_csv(
+                path('has_strength.csv'), score_header, ([r['series'], r['dimension'], r['score']] for r in strength_rels)
+            )),
+            ('HAS_WEAKNESS', _write_import_csv(
+                path('has_weakness.csv'), score_header, ([r['series'], r['dimension'], r['score']] for r in weakness_rels)
+            )),
+            ('PRIORITIZES', _write_import_csv(
+                path('prioritizes.csv'), [':START_ID(Persona)', ':END_ID(Dimension)', 'weight:double'],
+                ([r['persona'], r['dimension'], r['weight']] for r in priorities)
+            )),
+            ('BELONGS_TO_PERSONA', review_files['personas'][0]),
+            ('EVALUATES', review_files['models'][0]),
+            ('EVALUATES', review_files['series'][0]),
+            ('MENTIONS', review_files['mentions'][0])
+        ]
+        logger.info(f"Exported {len(nodes)} node files and {len(rels)} relationship files to {import_dir}")
+        return nodes, rels
 
-        logger.info(f"Import complete! Total: {total_reviews} reviews, {total_mentions} dimension mentions")
+    def build_offline(self, import_dir=IMPORT_DIR):
+        """
+        离线全量构建：导出 CSV 后调用 neo4j-admin database import full 直接生成存储文件
+        
+        仅适用于自建 Neo4j（Aura 不提供 neo4j-admin）；导入前数据库需停止，已有数据会被覆盖
+        
+        Args:
+            import_dir: CSV 输出目录
+        """
+        logger.info("=" * 60)
+        logger.info("Starting Offline Knowledge Graph Import (neo4j-admin)")
+        logger.info("=" * 60)
+        
+        nodes, rels = self.export_import_csvs(import_dir)
+        cmd = [
+            NEO4J_ADMIN, 'database', 'import', 'full',
+            '--overwrite-destination=true',
+            '--multiline-fields=true',
+            *[f'--nodes={label}={file_path}' for label, file_path in nodes],
+            *[f'--relationships={rel_type}={file_path}' for rel_type, file_path in rels],
+            self.database
+        ]
+        logger.info(f"Running: {' '.join(cmd[:4])} ... {self.database}")
+        subprocess.run(cmd, check=True)
+        
+        logger.info("=" * 60)
+        logger.info("Offline import completed! Start the database and run create_constraints() to add constraints and indexes")
+        logger.info("=" * 60)
 
     def build(self, limit=None, random_sample=False):
         """
@@ -522,8 +915,10 @@ class Neo4jGraphBuilder:
             self.create_constraints()
             self.import_dimensions()
             self.import_vehicles()
-            self.import_personas()
-            self.import_reviews(limit=limit, random_sample=random_sample)
+            # 用户画像表只读取一次，画像导入与评论导入共用
+            persona_df = self.load_personas()
+            self.import_personas(persona_df)
+            self.import_reviews(limit=limit, random_sample=random_sample, persona_df=persona_df)
             
             logger.info("=" * 60)
             logger.info("Knowledge Graph Construction Completed Successfully!")
@@ -537,6 +932,30 @@ class Neo4jGraphBuilder:
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build Neo4j Knowledge Graph")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Export CSVs and run neo4j-admin database import full (self-hosted Neo4j, database must be stopped)"
+    )
+    args = parser.parse_args()
+    
+    if args.offline:
+        # 离线导入不连接数据库，只需数据库名
+        builder = Neo4jGraphBuilder(
+            uri=NEO4J_URI or "neo4j://localhost:7687",
+            user=NEO4J_USER,
+            password=NEO4J_PASSWORD or "",
+            database=NEO4J_DATABASE
+        )
+        try:
+            builder.build_offline()
+        finally:
+            builder.close()
+        raise SystemExit(0)
+    
     # 验证必需的环境变量
     if not NEO4J_URI:
         raise ValueError("NEO4J_URI environment variable is required")